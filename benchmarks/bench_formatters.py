@@ -0,0 +1,45 @@
+"""Per-record cost of the formatters selectable with `Loggable(output=...)`.
+
+Usage: python -m benchmarks.bench_formatters
+"""
+
+import logging
+import timeit
+
+from colorlog import ColoredFormatter
+
+from loggable import Loggable
+from loggable.formatters import ColorFormatter, PlainFormatter, JSONFormatter
+
+N = 100000
+
+
+def main():
+    record = logging.LogRecord(
+        "bench", logging.INFO, __file__, 1, "message %d", (1,), None
+    )
+    formatters = [
+        (
+            "colorlog",
+            ColoredFormatter(
+                Loggable.DEFAULT_FORMAT, log_colors=Loggable.DEFAULT_COLORS
+            ),
+        ),
+        (
+            "color",
+            ColorFormatter(Loggable.DEFAULT_FORMAT, log_colors=Loggable.DEFAULT_COLORS),
+        ),
+        ("plain", PlainFormatter(Loggable.DEFAULT_FORMAT)),
+        ("json", JSONFormatter()),
+    ]
+    baseline = None
+    for name, formatter in formatters:
+        t = timeit.timeit(lambda: formatter.format(record), number=N)
+        baseline = baseline or t
+        print(
+            "{:8} {:8.2f} us/record  {:5.1f}x".format(name, t / N * 1e6, baseline / t)
+        )
+
+
+if __name__ == "__main__":
+    main()
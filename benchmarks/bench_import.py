@@ -0,0 +1,50 @@
+"""Time of `import loggable` in a fresh interpreter, and a check that the
+optional dependencies stay unimported. colorlog, tqdm and arrow are only
+imported once a colored formatter, a progress bar or a timed block needs them,
+so logging with plain output must not import any of them.
+
+Usage: python -m benchmarks.bench_import
+"""
+
+import subprocess
+import sys
+
+N = 20
+DEFERRED = ("colorlog", "tqdm", "arrow")
+
+TIMER = """
+import time
+t = time.perf_counter()
+import {}
+print((time.perf_counter() - t) * 1000)
+"""
+
+CHECK = """
+import sys
+import loggable
+loggable.Loggable("bench", output="plain").error("failed")
+print("imported:", *(m for m in {!r} if m in sys.modules))
+"""
+
+
+def run(code):
+    out = subprocess.check_output([sys.executable, "-c", code])
+    return out.decode().splitlines()[-1]
+
+
+def best_of(module, n=N):
+    """The best time of importing `module` in a new interpreter, in ms."""
+    return min(float(run(TIMER.format(module))) for _ in range(n))
+
+
+def main():
+    for module in ("logging", "loggable") + DEFERRED:
+        print("import {:9} {:8.2f} ms".format(module, best_of(module)))
+    imported = run(CHECK.format(DEFERRED)).split()[1:]
+    if imported:
+        print("regression: logging imported " + ", ".join(imported))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,125 @@
 import logging
-import math
 import pprint
-import traceback
+import sys
+import threading
+import time
 from logging import DEBUG, INFO, CRITICAL, ERROR, WARNING, WARN
-from colorlog import ColoredFormatter
-from tqdm import tqdm
-import arrow
 from abc import ABC, abstractmethod
+from datetime import timedelta
 import weakref
+from functools import partial, wraps
 from itertools import count
+from types import FunctionType, MethodType
 from warnings import warn
 
+from loggable import aio, formatters, metrics, stacks, timing
+from loggable.aio import AsyncProgress
+from loggable.condense import condense_long_lists
+from loggable.metrics import LogMetrics, log_metrics
+from loggable.timing import perf_counter_ns
+from loggable.formatters import PlainFormatter, JSONFormatter
+from loggable.sampling import (
+    CallSiteSampler,
+    SamplingPolicy,
+    RateLimit,
+    Sample,
+    FirstThenEvery,
+)
+from loggable.handlers import (
+    LoggableHandler,
+    TqdmLoggingHandler,
+    FlightRecorder,
+    tqdm_class,
+    AsyncWriter,
+    enable_async,
+    disable_async,
+    adisable_async,
+)
+
+if sys.version_info < (3, 7):
+    from loggable.binlog import BinaryLogHandler, BinaryLogReader
+    from loggable.files import FileSink, FileSinkHandler, file_sink
+
+
+def __getattr__(name):
+    # binlog (and mmap) and files (and gzip) are only imported once used
+    if name in ("BinaryLogHandler", "BinaryLogReader"):
+        from loggable import binlog
+
+        return getattr(binlog, name)
+    if name in ("FileSink", "FileSinkHandler", "file_sink"):
+        from loggable import files
+
+        return getattr(files, name)
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
+def _handle_many(logger, records):
+    """Handle records like `logger.handle` does, except that each
+    :class:`LoggableHandler` is given all of them at once."""
+    if logger.disabled:
+        return
+    accepted = []
+    for record in records:
+        rv = logger.filter(record)
+        if isinstance(rv, logging.LogRecord):
+            record = rv
+        if rv:
+            accepted.append(record)
+    c = logger
+    while c is not None:
+        for handler in c.handlers:
+            if isinstance(handler, LoggableHandler):
+                handler.handle_many(accepted)
+            else:
+                for record in accepted:
+                    if record.levelno >= handler.level:
+                        handler.handle(record)
+        c = c.parent if c.propagate else None
+
+
+# inspect.CO_COROUTINE, without importing inspect
+_CO_COROUTINE = 0x80
+
+
+def _is_coroutine_function(fxn):
+    code = getattr(fxn, "__code__", None)
+    return code is not None and bool(code.co_flags & _CO_COROUTINE)
+
+
+def _disabled(ref, state, level, log_metrics, suppressed, msg, *args):
+    """Bound in place of level methods that are disabled: only counts the
+    message as suppressed, as `Loggable.log` would, on the `suppressed`
+    counter of `log_metrics`. Like `Loggable.log`, it
+    returns the logger (from a weak reference, so the logger is not kept
+    alive by its own methods) so calls can be chained.
+
+    Once the handler of `state` has changed, the message goes through
+    `Loggable.log`, which resolves the state again and rebinds the methods.
+    """
+    self = ref()
+    if self is None:
+        # the logger was only referenced by the expression calling the method
+        return None
+    if state.generation != state.handler.generation:
+        return self.log(msg, level, *args)
+    if log_metrics.enabled:
+        next(suppressed)
+    return self
+
+
+# level methods that are rebound to `_disabled` when their level is disabled
+_LEVEL_METHODS = (
+    ("critical", CRITICAL),
+    ("error", ERROR),
+    ("warn", WARNING),
+    ("info", INFO),
+    ("debug", DEBUG),
+)
+
+# frames from this file are skipped when finding the call site of a message
+_srcfile = _disabled.__code__.co_filename
+
 
 class LoggableWarning(Warning):
     """Generic logger warning"""
@@ -20,50 +129,132 @@ class LoggableException(Exception):
     """Generic exception for loggable class"""
 
 
-class LoggableHandler(logging.Handler):
-    pass
+# message types that are called to produce the message, only once the level
+# is known to be enabled. Classes and other callable objects are logged as-is.
+_CALLABLE_MESSAGES = (FunctionType, MethodType, partial)
 
 
-class TqdmLoggingHandler(LoggableHandler):
-    def __init__(self, level=logging.NOTSET, tqdm=tqdm):
-        super().__init__(level)
-        self._tqdm = tqdm
-        self.tb_limit = 0
+def _render_message(msg, args=()):
+    """Render a (possibly callable) message with its %-style args."""
+    if isinstance(msg, _CALLABLE_MESSAGES):
+        msg = msg()
+    msg = str(msg)
+    if args:
+        msg = msg % args
+    return msg
 
-    def emit(self, record):
-        try:
-            msg = self.format(record)
-            self._tqdm.write(msg)
-            self.flush()
-        except (KeyboardInterrupt, SystemExit):
-            raise
-        except:
-            self.handleError(record)
 
+class LazyMessage(object):
+    """A log message that is only rendered when converted to a string, e.g.
+    when a log record is actually emitted. The rendered string is cached.
 
-def condense_long_lists(d, max_list_len=20):
-    """
-    Condense the long lists in a dictionary
-
-    :param d: dictionary to condense
-    :type d: dict
-    :param max_len: max length of lists to display
-    :type max_len: int
-    :return:
-    :rtype:
+    :param fxn: function returning the message
+    :param args: args to call the function with
+    :param kwargs: kwargs to call the function with
     """
-    if isinstance(d, dict):
-        return_dict = {}
-        for k in d:
-            return_dict[k] = condense_long_lists(dict(d).pop(k))
-        return dict(return_dict)
-    elif isinstance(d, list):
-        if len(d) > max_list_len:
-            g = max_list_len / 2
-            return d[: math.floor(g)] + ["..."] + d[-math.ceil(g) :]
-        else:
-            return d[:]
-    return str(d)
+
+    __slots__ = ("_fxn", "_args", "_kwargs", "_rendered")
+
+    def __init__(self, fxn, *args, **kwargs):
+        self._fxn = fxn
+        self._args = args
+        self._kwargs = kwargs
+        self._rendered = None
+
+    def __str__(self):
+        if self._rendered is None:
+            self._rendered = str(self._fxn(*self._args, **self._kwargs))
+        return self._rendered
+
+    def __format__(self, format_spec):
+        return format(str(self), format_spec)
+
+    def __eq__(self, other):
+        if isinstance(other, (str, LazyMessage)):
+            return str(self) == str(other)
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(str(self))
+
+    def __repr__(self):
+        return "<{} {!r}>".format(self.__class__.__name__, str(self))
+
+
+def _pformat_data(data, width, depth, max_list_len, compact, indent):
+    return pprint.pformat(
+        condense_long_lists(data, max_list_len=max_list_len, max_depth=depth),
+        indent=indent,
+        width=width,
+        depth=depth,
+        compact=compact,
+    )
+
+
+# stamps of level changes, in order
+_level_changes = count(1)
+
+# children of a Loggable that never registered any
+_NO_CHILDREN = weakref.WeakValueDictionary()
+
+
+def _release_children(id):
+    """Drop the children registered under `id` once no owner is left."""
+    owners = Loggable._owners.get(id, 0) - 1
+    if owners > 0:
+        Loggable._owners[id] = owners
+    else:
+        Loggable._owners.pop(id, None)
+        Loggable.registered.pop(id, None)
+        Loggable._settings.pop(id, None)
+
+
+def _instance_name_filter(record):
+    """Show records of shared loggers under the name of their instance."""
+    name = getattr(record, "instance_name", None)
+    if name is not None:
+        record.logger_name = record.name  # counted under the shared logger
+        record.name = name
+    return True
+
+
+def _timed_message(name, elapsed_ns):
+    return '{}("{}"): Finished in {}.'.format(
+        TimedLoggable.__name__, name, timedelta(microseconds=elapsed_ns / 1000)
+    )
+
+
+class _ResolvedState(object):
+    """Logger state resolved by a :class:`Loggable`, valid while the handler's
+    generation equals ``generation``."""
+
+    __slots__ = (
+        "generation",
+        "logger",
+        "handler",
+        "level",
+        "tb_limit",
+        "level_generation",
+        "recorders",
+        "gate",
+        "ancestors",
+    )
+
+    def __init__(self, generation, logger, handler, own_id):
+        self.generation = generation
+        # the level generation ancestors were last checked at
+        self.level_generation = 0
+        self.logger = logger
+        self.handler = handler
+        self.level = handler.level
+        self.tb_limit = handler.tb_limit
+        self.recorders = tuple(
+            h for h in logger.handlers if isinstance(h, FlightRecorder)
+        )
+        # the lowest level any handler wants to see
+        self.gate = min([self.level] + [r.level for r in self.recorders])
+        # the Loggables whose level settings the handler inherits
+        self.ancestors = handler.ancestors.difference((own_id,))
 
 
 class Loggable(object):
@@ -79,8 +270,28 @@ class Loggable(object):
     graph = {}
     registered = {}  # id to Loggable
     counter = count()
+    _owners = {}  # id to number of live Loggables owning its children
+    _settings = {}  # id to the last level setting of a Loggable with children
+    _level_generation = 0  # stamp of the last level change of any Loggable
+    _ancestors = ()  # ids of the parent, grandparent, etc.
+    _level_set = None  # (stamp, level, tb_limit) of the last set_level
+    log_metrics = metrics.log_metrics
+    _resolved = None
+    _sampler = None
+    _extra = None
+    output = None
+    file = None
 
-    def __init__(self, object_or_name, format=None, log_colors=None, tqdm=tqdm):
+    def __init__(
+        self,
+        object_or_name,
+        format=None,
+        log_colors=None,
+        tqdm=None,
+        output=None,
+        shared=False,
+        file=None,
+    ):
         """
         Instantiates a new logger
 
@@ -92,10 +303,36 @@ class Loggable(object):
         :param log_colors: The logger colors. Default is found
             Loggable.DEFAULT_COLORS.
         :param tqdm: This tqdm class to instantiate progress bars with.
-            Default is tqdm.tqdm.
+            Default is tqdm.tqdm, which is imported when a progress bar is
+            first needed.
+        :param output: The output mode, one of "color", "plain" (no colors,
+            faster) or "json" (JSON lines). Default is "color" if stdout is a
+            terminal and "plain" otherwise.
+        :param shared: If True and an object is provided, all instances of the
+            object's class share one native logger (and so one level), named
+            after the class. Records are tagged with the `instance_id` and
+            `instance_name` of the object, and are shown under the instance
+            name. Use this for classes with many short-lived instances, since
+            native loggers are never freed.
+        :param file: Write to this file instead of the terminal, through the
+            :class:`FileSink` of the path (see :func:`file_sink` to configure
+            it). The output mode defaults to "plain".
         """
+        if output is not None and output not in formatters.OUTPUTS:
+            raise ValueError(
+                "Output '{}' not recognized. Select from {}".format(
+                    output, formatters.OUTPUTS
+                )
+            )
         if isinstance(object_or_name, str):
             self.name = object_or_name
+        elif shared:
+            cls = object_or_name.__class__
+            self.name = "{}.{}".format(cls.__module__, cls.__qualname__)
+            self._extra = {
+                "instance_id": id(object_or_name),
+                "instance_name": "{}(id={})".format(cls.__name__, id(object_or_name)),
+            }
         else:
             self.name = "{}(id={})".format(
                 object_or_name.__class__.__name__, id(object_or_name)
@@ -104,19 +341,33 @@ class Loggable(object):
         self.format = format or self.DEFAULT_FORMAT
         self.log_colors = log_colors or self.DEFAULT_COLORS
         self._tqdm = tqdm
+        self.output = output
+        self.file = file
         self._id = next(self.counter)
+        self._resolved = None
 
     def _new_logger(self, name, level=logging.ERROR):
         """Instantiate a new logger with the given name. If channel handler
         exists, do not create a new one."""
         logger = logging.getLogger(name)
         logger.setLevel(logging.DEBUG)
-        handlers = self._log_handlers(logger)
+        if self._extra is not None and _instance_name_filter not in logger.filters:
+            logger.addFilter(_instance_name_filter)
+        handlers = [
+            h for h in self._log_handlers(logger) if not isinstance(h, FlightRecorder)
+        ]
         # make stream handler
         if not handlers:
-            handler = TqdmLoggingHandler(level, tqdm=self._tqdm)
+            output = self.output
+            if self.file is None:
+                handler = TqdmLoggingHandler(level, tqdm=self._tqdm)
+            else:
+                from loggable.files import FileSinkHandler, file_sink
+
+                handler = FileSinkHandler(file_sink(self.file), level)
+                output = output or formatters.PLAIN
             handler.tb_limit = 0
-            formatter = ColoredFormatter(self.format, log_colors=self.log_colors)
+            formatter = formatters.new_formatter(output, self.format, self.log_colors)
             handler.setFormatter(formatter)
             logger.addHandler(handler)
         else:
@@ -126,18 +377,151 @@ class Loggable(object):
     @property
     def _children(self):
         """The logger's children loggers."""
-        return self.registered.setdefault(self._id, weakref.WeakValueDictionary())
+        return self.registered.get(self._id, _NO_CHILDREN)
+
+    def _own_children(self):
+        """Keep the children registered under this logger's id until every
+        Loggable with this id (e.g. unpickled copies) has been collected."""
+        Loggable._owners[self._id] = Loggable._owners.get(self._id, 0) + 1
+        weakref.finalize(self, _release_children, self._id).atexit = False
+
+    def _resolve(self):
+        """Return the cached logger state, resolving it again if the primary
+        handler has changed since it was cached."""
+        state = self._resolved
+        if state is None or state.generation != state.handler.generation:
+            logger, handler = self._new_logger(self.name)
+            if not handler.ancestors.issuperset(self._ancestors):
+                # any Loggable of the native logger inherits from our ancestors
+                handler.ancestors = handler.ancestors.union(self._ancestors)
+                handler.invalidate()
+            # read the generation before the handler's fields so a concurrent
+            # change can only ever make the new state look stale
+            generation = handler.generation
+            state = _ResolvedState(generation, logger, handler, self._id)
+            self._resolved = state
+            self._bind_level_methods(state)
+        if state.ancestors and state.level_generation != Loggable._level_generation:
+            state.level_generation = Loggable._level_generation
+            if self._inherit_level(state):
+                return self._resolve()
+        return state
+
+    def _inherit_level(self, state):
+        """Apply the most recent level set on an ancestor of the handler's
+        Loggables, if it was set after the last level applied to the handler.
+
+        :return: whether the handlers changed
+        """
+        setting = None
+        settings = self._settings
+        for id in state.ancestors:
+            inherited = settings.get(id)
+            if inherited is not None and (setting is None or inherited[0] > setting[0]):
+                setting = inherited
+        if setting is None or setting[0] <= state.handler.level_stamp:
+            return False
+        self._apply_level(*setting)
+        return True
+
+    def _bind_level_methods(self, state):
+        """Bind disabled level methods (e.g. `debug`) on this instance to a
+        function that only counts them, and restore the class methods for
+        enabled ones.
+
+        Methods overridden by a subclass are left untouched, and so are the
+        methods of loggers whose handler inherits levels from ancestors,
+        which only see a level change of an ancestor when they next log.
+        Bound methods check that the handler has not
+        changed since, so a change made through another Loggable sharing the
+        handler is seen on the next call.
+        """
+        d = self.__dict__
+        cls = self.__class__
+        root = not state.ancestors
+        ref = None
+        log_metrics = self.log_metrics
+        for name, level in _LEVEL_METHODS:
+            if (
+                root
+                and level < state.gate
+                and getattr(cls, name) is getattr(Loggable, name)
+            ):
+                if ref is None:
+                    ref = weakref.ref(self)
+                d[name] = partial(
+                    _disabled,
+                    ref,
+                    state,
+                    level,
+                    log_metrics,
+                    log_metrics.suppressed_counter(self.name, level),
+                )
+            else:
+                d.pop(name, None)
 
     @property
     def logger(self):
         """The native logger"""
-        return self._new_logger(self.name)[0]
+        return self._resolve().logger
 
     @property
     def logger_handlers(self):
         """The logging handlers for this logger."""
         return self._log_handlers(self.logger)
 
+    def add_handler(self, handler):
+        """Attach a handler to the native logger."""
+        logger = self.logger
+        logger.addHandler(handler)
+        for h in self._log_handlers(logger):
+            h.invalidate()
+        return self
+
+    def remove_handler(self, handler):
+        """Detach a handler from the native logger."""
+        logger = self.logger
+        logger.removeHandler(handler)
+        if isinstance(handler, LoggableHandler):
+            handler.invalidate()
+        for h in self._log_handlers(logger):
+            h.invalidate()
+        return self
+
+    def flight_recorder(
+        self, capacity=1000, trigger_level="ERROR", capture_level="DEBUG"
+    ):
+        """Attach a :class:`FlightRecorder` that keeps the last `capacity`
+        records down to `capture_level`, whatever the level of this logger,
+        and writes them through this logger's handler when a record at or
+        above `trigger_level` is logged. The recorder is placed ahead of the
+        logger's handlers, so the records are written before the one that
+        triggered the dump.
+
+        :return: the recorder, whose `dump` method writes the buffered records
+        """
+        state = self._resolve()
+        recorder = FlightRecorder(
+            capacity,
+            trigger_level=self._get_level(trigger_level),
+            capture_level=self._get_level(capture_level),
+            target=state.handler,
+        )
+        logger = state.logger
+        # replace the list rather than inserting, as logger.addHandler does
+        logger.handlers = [recorder] + logger.handlers
+        for h in self._log_handlers(logger):
+            h.invalidate()
+        return recorder
+
+    def collapse_repeats(self, interval=1.0):
+        """Write runs of identical messages of this logger as a single
+        "last message repeated N times" line, at most every `interval`
+        seconds. Use None to write every message. See
+        :meth:`LoggableHandler.collapse_repeats`."""
+        self._resolve().handler.collapse_repeats(interval)
+        return self
+
     def set_tb_limit(self, limit):
         """Set the throwback limit."""
         for h in self.logger.handlers:
@@ -150,12 +534,12 @@ class Loggable(object):
 
     def level(self):
         """Return the current level, as an int."""
-        return self.logger_handlers[0].level
+        return self._resolve().level
 
     def is_enabled(self, level):
         """Returns whether this logger is enabled for the level specified."""
         level = self._get_level(level)
-        return level >= self.level()
+        return level >= self._resolve().level
 
     def _get_level(self, level):
         if isinstance(level, str):
@@ -173,16 +557,37 @@ class Loggable(object):
         return level
 
     def set_level(self, level, tb_limit=None):
-        """Sets the level for this logger and its children."""
+        """Sets the level for this logger and its children.
+
+        Children are not visited: every level change is stamped, and the
+        native logger of a child takes the most recent level set on it or an
+        ancestor of any of its Loggables the next time one of them (or a new
+        Loggable of the same name) is used. Until then, the native logger,
+        e.g. ``logging.getLogger(name)``, keeps its previous level. Level
+        methods (`debug`, `info`, etc.) of this
+        logger and any other Loggable sharing the native logger only count
+        the message while their level is disabled."""
         level = self._get_level(level)
-        self.logger.setLevel(level)
-        for h in self.logger.handlers:
-            h.setLevel(level)
+        stamp = next(_level_changes)
+        setting = (stamp, level, tb_limit)
+        self._level_set = setting
+        if self._id in self.registered:
+            self._settings[self._id] = setting
+        Loggable._level_generation = stamp
+        self._apply_level(stamp, level, tb_limit)
+        # rebind the level methods of this logger now, others rebind lazily
+        self._resolve()
+        return self
+
+    def _apply_level(self, stamp, level, tb_limit):
+        logger = self.logger
+        logger.setLevel(level)
+        for h in logger.handlers:
+            if getattr(h, "follows_level", True):
+                h.level_stamp = stamp
+                h.setLevel(level)
         if tb_limit is not None:
             self.set_tb_limit(tb_limit)
-        for child in self._children.values():
-            child.set_level(level, tb_limit=tb_limit)
-        return self
 
     def set_verbose(self, verbose, tb_limit=0):
         """Sets to 'INFO' if True, or 'ERROR' if False"""
@@ -191,88 +596,270 @@ class Loggable(object):
         else:
             return self.set_level(logging.ERROR, tb_limit)
 
+    def set_sampling(self, policy):
+        """Rate limit or sample the messages of this logger per call site,
+        e.g. `RateLimit(10)`, `Sample(100)` or `FirstThenEvery(10, 100)`. Use
+        None to emit every message. Each period with suppressed messages ends
+        with a summary record. See :mod:`loggable.sampling`."""
+        if policy is None:
+            self._sampler = None
+        else:
+            self._sampler = CallSiteSampler(
+                policy, skip_files=(_srcfile,), report=self.logger.log
+            )
+        return self
+
+    def flush_suppressed(self):
+        """Log the summaries of messages suppressed by the sampling policy
+        that have not been reported yet."""
+        if self._sampler is not None:
+            logger = self.logger
+            for level, msg in self._sampler.flush():
+                logger.log(level, msg)
+        return self
+
     def pprint_data(
         self, data, width=80, depth=10, max_list_len=20, compact=True, indent=1
     ):
-        """Pretty print data"""
-        return pprint.pformat(
-            condense_long_lists(data, max_list_len=max_list_len),
-            indent=indent,
+        """Pretty print data. The data is condensed and formatted only when
+        the returned :class:`LazyMessage` is converted to a string, so passing
+        it to a disabled level costs nothing."""
+        return LazyMessage(
+            _pformat_data,
+            data,
             width=width,
             depth=depth,
+            max_list_len=max_list_len,
             compact=compact,
+            indent=indent,
         )
 
     pprint = pprint_data
 
+    def metrics(self):
+        """Return the counters of this logger since the last reset, as
+        ``{level name: {counter: value}}`` (see :mod:`loggable.metrics`)."""
+        return self.log_metrics.snapshot(self.name)
+
+    def log_timings(self, level="INFO", reset=False):
+        """Log the summary table of the timed blocks recorded so far (see
+        :mod:`loggable.timing`)."""
+        stats = TimedLoggable.stats
+        if self.is_enabled(level):
+            self.log("Timings:\n" + stats.summary(), level)
+        if reset:
+            stats.reset()
+        return self
+
     def tqdm(self, iterable, level, *args, **kwargs):
-        """Produce a logged progress bar for an interable"""
+        """Produce a logged progress bar for an interable. Async iterables
+        are wrapped in an :class:`AsyncProgress`, for use with `async for`."""
         level = self._get_level(level)
         if self.is_enabled(level):
-            progress_bar = self._tqdm(iterable, *args, **kwargs)
+            is_async = aio.is_async_iterable(iterable)
+            if is_async and kwargs.get("total") is None:
+                kwargs["total"] = getattr(iterable, "__len__", lambda: None)()
+            progress_bar = self._progress_cls()(
+                None if is_async else iterable, *args, **kwargs
+            )
             progress_bar.set_description(
                 "{:8} {}".format(logging._levelToName[level], progress_bar.desc)
             )
+            if is_async:
+                return AsyncProgress(iterable, progress_bar)
             return progress_bar
         else:
             return iterable
 
+    def _progress_cls(self):
+        """The tqdm class to draw progress bars with. A writer installed on the
+        handler (see :mod:`loggable.multiprocess`) may redirect progress bars."""
+        writer = getattr(self._resolve().handler, "writer", None)
+        return getattr(writer, "progress_cls", None) or tqdm_class(self._tqdm)
+
     def _add_child(self, other):
-        self._children[other._id] = other
+        children = self.registered.get(self._id)
+        if children is None:
+            children = weakref.WeakValueDictionary()
+            self.registered[self._id] = children
+            self._own_children()
+            if self._level_set is not None:
+                self._settings[self._id] = self._level_set
+        children[other._id] = other
+        other._ancestors = self._ancestors + (self._id,)
+        other._resolved = None
+        other._resolve()
         return other
 
     def spawn(self, cls=None, *args, **kwargs):
         if cls is None:
             cls = self.__class__
-        dets = dict(format=self.format, log_colors=self.log_colors, tqdm=self._tqdm)
+        dets = self._options()
         dets.update(kwargs)
         return cls(self.name, *args, **dets)
 
+    def _options(self):
+        """The options passed on to copies and children of this logger."""
+        return dict(
+            format=self.format,
+            log_colors=self.log_colors,
+            tqdm=self._tqdm,
+            output=self.output,
+            file=self.file,
+        )
+
     def _log_handlers(self, logger):
         return [h for h in logger.handlers if issubclass(type(h), LoggableHandler)]
 
-    def log(self, msg, level):
-        """Log at specified level"""
+    def log(self, msg, level, *args):
+        """Log at specified level.
+
+        The message is rendered lazily: `args` are merged into `msg` using
+        %-formatting only when the record is emitted, and if `msg` is a
+        zero-arg function it is called only if the level is enabled.
+        """
         level = self._get_level(level)
-        logger = self.logger
-        logger.log(level, msg)
-        if logger.isEnabledFor(level):
-            tb_limit = self.logger_handlers[0].tb_limit
-            if tb_limit:
-                traceback.print_stack(limit=tb_limit)
+        state = self._resolve()
+        log_metrics = self.log_metrics
+        if level < state.level:
+            if log_metrics.enabled:
+                log_metrics.count(self.name, level, metrics.SUPPRESSED)
+            if level >= state.gate:
+                self._capture(state, level, msg, args)
+            return self
+        if self._sampler is not None:
+            allowed, summary = self._sampler.check(level)
+            if summary is not None:
+                state.logger.log(*summary)
+            if not allowed:
+                if log_metrics.enabled:
+                    log_metrics.count(self.name, level, metrics.SUPPRESSED)
+                return self
+        if log_metrics.enabled:
+            log_metrics.count(self.name, level, metrics.EMITTED)
+        if isinstance(msg, _CALLABLE_MESSAGES):
+            msg = msg()
+        extra = self._extra
+        if state.tb_limit:
+            extra = dict(extra or ())
+            extra[stacks.STACK_FRAMES] = stacks.capture(
+                state.tb_limit, skip_files=(_srcfile,)
+            )
+        state.logger.log(level, msg, *args, extra=extra)
         return self
 
-    def critical(self, msg):
+    def log_many(self, messages, level):
+        """Log each of `messages` at a level, in order. The level is checked
+        once, and the records are handled as one batch: a
+        :class:`TqdmLoggingHandler` formats them all and writes them with a
+        single `tqdm.write`. Messages may be zero-arg functions, as for
+        `log`."""
+        level = self._get_level(level)
+        state = self._resolve()
+        if level < state.gate:
+            log_metrics = self.log_metrics
+            if log_metrics.enabled:
+                n = sum(1 for _ in messages)
+                log_metrics.count(self.name, level, metrics.SUPPRESSED, n)
+            return self
+        return self._log_batch(state, ((level, msg) for msg in messages))
+
+    def log_pairs(self, pairs):
+        """Log (level, message) pairs in order, as one batch like
+        `log_many`."""
+        state = self._resolve()
+        get_level = self._get_level
+        return self._log_batch(state, ((get_level(level), msg) for level, msg in pairs))
+
+    def _capture(self, state, level, msg, args=()):
+        """Hand a suppressed message to the flight recorders that keep it."""
+        if isinstance(msg, _CALLABLE_MESSAGES):
+            msg = LazyMessage(msg)
+        for recorder in state.recorders:
+            if level >= recorder.level:
+                recorder.capture(self.name, level, msg, args, self._extra)
+
+    def _log_batch(self, state, entries):
+        logger = state.logger
+        fn, lno, func = logger.findCaller()[:3]
+        extra = self._extra
+        if state.tb_limit:
+            extra = dict(extra or ())
+            extra[stacks.STACK_FRAMES] = stacks.capture(
+                state.tb_limit, skip_files=(_srcfile,)
+            )
+        records = []
+        log_metrics = self.log_metrics
+        enabled = {}  # level to logger.isEnabledFor(level), e.g. logging.disable
+        for level, msg in entries:
+            if level < state.level:
+                if log_metrics.enabled:
+                    log_metrics.count(self.name, level, metrics.SUPPRESSED)
+                if level >= state.gate:
+                    # write the records before it, so recorders keep the order
+                    if records:
+                        _handle_many(logger, records)
+                        records = []
+                    self._capture(state, level, msg)
+                continue
+            if self._sampler is not None:
+                allowed, summary = self._sampler.check(level)
+                if summary is not None and logger.isEnabledFor(summary[0]):
+                    records.append(
+                        logger.makeRecord(
+                            logger.name, summary[0], fn, lno, summary[1], (), None
+                        )
+                    )
+                if not allowed:
+                    if log_metrics.enabled:
+                        log_metrics.count(self.name, level, metrics.SUPPRESSED)
+                    continue
+            if log_metrics.enabled:
+                log_metrics.count(self.name, level, metrics.EMITTED)
+            is_enabled = enabled.get(level)
+            if is_enabled is None:
+                is_enabled = enabled[level] = logger.isEnabledFor(level)
+            if not is_enabled:
+                continue
+            if isinstance(msg, _CALLABLE_MESSAGES):
+                msg = msg()
+            records.append(
+                logger.makeRecord(
+                    logger.name, level, fn, lno, msg, (), None, func, extra
+                )
+            )
+        if records:
+            _handle_many(logger, records)
+        return self
+
+    def critical(self, msg, *args):
         """Log critical error"""
-        return self.log(msg, CRITICAL)
+        return self.log(msg, CRITICAL, *args)
 
-    def error(self, msg):
+    def error(self, msg, *args):
         """Log error"""
-        return self.log(msg, ERROR)
+        return self.log(msg, ERROR, *args)
 
-    def warn(self, msg):
+    def warn(self, msg, *args):
         """Log warning"""
-        return self.log(msg, WARNING)
+        return self.log(msg, WARNING, *args)
 
-    def info(self, msg):
+    def info(self, msg, *args):
         """Log info"""
-        return self.log(msg, INFO)
+        return self.log(msg, INFO, *args)
 
-    def debug(self, msg):
+    def debug(self, msg, *args):
         """Log debug"""
-        return self.log(msg, DEBUG)
+        return self.log(msg, DEBUG, *args)
 
     def __copy__(self):
         return self.copy()
 
     def copy(self, name=None):
         """Copy this logger"""
-        copied = self.__class__(
-            name or self.name,
-            format=self.format,
-            log_colors=self.log_colors,
-            tqdm=self._tqdm,
-        )
+        copied = self.__class__(name or self.name, **self._options())
+        if name is None:
+            copied._extra = self._extra
         copied.set_level(self.level())
         return copied
 
@@ -284,27 +871,89 @@ class Loggable(object):
     def timeit(self, level, prefix=""):
         """Spawn a logger that computes the time it takes to run commands.
         The start time and total time will be logged."""
-        child = TimedLoggable(
-            self.name,
-            level,
-            prefix=prefix,
-            format=self.format,
-            log_colors=self.log_colors,
-            tqdm=self._tqdm,
-        )
+        child = TimedLoggable(self.name, level, prefix=prefix, **self._options())
         child.set_level(self.level())
         return self._add_child(child)
 
-    def track(self, level, total=None, desc=None):
-        """Spawn a progress bar logger, which can update a progress bar."""
+    def timed(self, level, prefix=None, sample_rate=1.0):
+        """Decorator timing the calls of a function, like :meth:`timeit` but
+        without creating a logger per call.
+
+        Only every `1 / sample_rate`-th call is timed, so the overhead of the
+        other calls is a counter increment. Timed calls are recorded in the
+        timing statistics and call tree (see :mod:`loggable.timing`) under
+        `prefix` (default is the function's qualified name), and log their
+        time at `level` if it is enabled. Coroutine functions are timed until
+        the coroutine finishes, not until it is created.
+        """
+        level = self._get_level(level)
+        if not 0 < sample_rate <= 1:
+            raise ValueError(
+                "sample_rate must be in (0, 1], not {}".format(sample_rate)
+            )
+        every = int(round(1 / sample_rate))
+
+        def decorator(fxn):
+            name = prefix or fxn.__qualname__
+            calls = count()
+
+            if _is_coroutine_function(fxn):
+
+                @wraps(fxn)
+                async def async_wrapper(*args, **kwargs):
+                    if every > 1 and next(calls) % every:
+                        return await fxn(*args, **kwargs)
+                    span, t1 = self._timed_start(name)
+                    try:
+                        return await fxn(*args, **kwargs)
+                    finally:
+                        self._timed_end(name, level, span, t1)
+
+                return async_wrapper
+
+            @wraps(fxn)
+            def wrapper(*args, **kwargs):
+                if every > 1 and next(calls) % every:
+                    return fxn(*args, **kwargs)
+                return self._timed_call(name, level, fxn, args, kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def _timed_call(self, name, level, fxn, args, kwargs):
+        span, t1 = self._timed_start(name)
+        try:
+            return fxn(*args, **kwargs)
+        finally:
+            self._timed_end(name, level, span, t1)
+
+    @staticmethod
+    def _timed_start(name):
+        tracer = TimedLoggable.tracer
+        span = tracer.start(name) if tracer.enabled else None
+        return span, perf_counter_ns()
+
+    def _timed_end(self, name, level, span, t1):
+        t2 = perf_counter_ns()
+        TimedLoggable.stats.record(name, t2 - t1)
+        if span is not None:
+            TimedLoggable.tracer.finish(span, t1, t2)
+        if level >= self._resolve().level:
+            self.log(partial(_timed_message, name, t2 - t1), level)
+
+    def track(self, level, total=None, desc=None, refresh_rate=None):
+        """Spawn a progress bar logger, which can update a progress bar. If
+        `refresh_rate` (per second) is given, updates are coalesced and the
+        progress bar is refreshed at most that often (see
+        :class:`ProgressLoggable`)."""
         child = ProgressLoggable(
             self.name,
             level,
             desc=desc,
             total=total,
-            format=self.format,
-            log_colors=self.log_colors,
-            tqdm=self._tqdm,
+            refresh_rate=refresh_rate,
+            **self._options(),
         )
         child.set_level(self.level())
         return self._add_child(child)
@@ -316,10 +965,25 @@ class Loggable(object):
         return self.spawn(name)
 
     def __getstate__(self):
-        return self.__dict__
+        d = dict(self.__dict__)
+        d["_resolved"] = None
+        d["_pickled_level"] = self.level()
+        for name, _ in _LEVEL_METHODS:
+            d.pop(name, None)
+        # ids and stamps are only meaningful in this process
+        for name in ("_ancestors", "_level_set"):
+            d.pop(name, None)
+        return d
 
     def __setstate__(self, d):
+        level = d.pop("_pickled_level", None)
         self.__dict__ = d
+        if self._id in self.registered:
+            self._own_children()
+        # restore the level when unpickled where the native logger does not
+        # exist yet, e.g. in a spawned worker process
+        if level is not None and not self._log_handlers(logging.getLogger(self.name)):
+            self.set_level(level)
 
     # def __str__(self):
     #     return "<{} {}>".format(self.__class__.__name__, self.logger)
@@ -329,23 +993,40 @@ class Loggable(object):
 
 
 class RenamedLoggable(Loggable):
-    def __init__(self, object_or_name, format=None, log_colors=None, tqdm=tqdm):
+    def __init__(
+        self,
+        object_or_name,
+        format=None,
+        log_colors=None,
+        tqdm=None,
+        output=None,
+        file=None,
+    ):
         new_name = "{}({})".format(self.__class__.__name__, object_or_name)
-        super().__init__(new_name, format, log_colors, tqdm)
+        super().__init__(new_name, format, log_colors, tqdm, output, file=file)
 
 
 class LockedLoggable(RenamedLoggable):
-    def __init__(self, object_or_name, level, format=None, log_colors=None, tqdm=tqdm):
-        super().__init__(object_or_name, format, log_colors, tqdm)
+    def __init__(
+        self,
+        object_or_name,
+        level,
+        format=None,
+        log_colors=None,
+        tqdm=None,
+        output=None,
+        file=None,
+    ):
+        super().__init__(object_or_name, format, log_colors, tqdm, output, file)
         self.locked_level = level
 
     def is_enabled(self, level=None):
         level = level or self.locked_level
         return super().is_enabled(level)
 
-    def log(self, msg, level=None):
+    def log(self, msg, level=None, *args):
         level = level or self.locked_level
-        super().log(msg, level)
+        super().log(msg, level, *args)
 
 
 class Enterable(ABC):
@@ -370,8 +1051,48 @@ class Enterable(ABC):
                 )
             )
 
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        return self.__exit__(exc_type, exc_val, exc_tb)
+
+
+class _StripedCounter(object):
+    """A counter with one cell per thread. Each cell is only written by its
+    own thread, so increments need no lock; the value is the sum of cells."""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._cells = []
+        self._lock = threading.Lock()
+
+    def add(self, x):
+        try:
+            cell = self._local.cell
+        except AttributeError:
+            cell = self._local.cell = [0]
+            with self._lock:
+                self._cells.append(cell)
+        cell[0] += x
+
+    @property
+    def value(self):
+        with self._lock:
+            cells = list(self._cells)
+        return sum(cell[0] for cell in cells)
+
 
 class ProgressLoggable(Enterable, LockedLoggable):
+    """A logger that draws a progress bar.
+
+    With a `refresh_rate` (per second) updates are coalesced: increments are
+    added to a per-thread counter and the progress bar is refreshed by at most
+    one thread at a time, at most `refresh_rate` times per second. The final
+    count is written on `exit()`. This makes `update` safe and cheap to call
+    from many threads.
+    """
+
     def __init__(
         self,
         object_or_name,
@@ -380,14 +1101,28 @@ class ProgressLoggable(Enterable, LockedLoggable):
         desc,
         format=None,
         log_colors=None,
-        tqdm=tqdm,
+        tqdm=None,
+        output=None,
+        refresh_rate=None,
+        file=None,
     ):
         super().__init__(
-            object_or_name, level, format=format, log_colors=log_colors, tqdm=tqdm
+            object_or_name,
+            level,
+            format=format,
+            log_colors=log_colors,
+            tqdm=tqdm,
+            output=output,
+            file=file,
         )
         self.desc = desc
         self.total = total
         self.pbar = None
+        self.refresh_rate = refresh_rate
+        self._counter = None
+        self._shown = 0
+        self._next_refresh = 0
+        self._refresh_lock = threading.Lock()
 
     def update(self, x=1, msg=""):
         if self.pbar is None:
@@ -396,9 +1131,38 @@ class ProgressLoggable(Enterable, LockedLoggable):
             )
         if msg:
             self.log(msg)
-        if self.is_enabled():
+        counter = self._counter
+        if counter is not None:
+            counter.add(x)
+            if time.monotonic() >= self._next_refresh:
+                self._refresh(counter)
+        elif self.is_enabled():
             self.pbar.update(x)
 
+    def __getstate__(self):
+        d = super().__getstate__()
+        d["_counter"] = None
+        del d["_refresh_lock"]
+        return d
+
+    def __setstate__(self, d):
+        super().__setstate__(d)
+        self._refresh_lock = threading.Lock()
+
+    def _refresh(self, counter, blocking=False):
+        """Write the coalesced count to the progress bar, unless another thread
+        is already doing so."""
+        if not self._refresh_lock.acquire(blocking):
+            return
+        try:
+            self._next_refresh = time.monotonic() + 1.0 / self.refresh_rate
+            value = counter.value
+            if value != self._shown:
+                self.pbar.update(value - self._shown)
+                self._shown = value
+        finally:
+            self._refresh_lock.release()
+
     def __call__(self, iterable, *args, **kwargs):
         d = {"desc": self.desc}
         d.update(kwargs)
@@ -406,13 +1170,22 @@ class ProgressLoggable(Enterable, LockedLoggable):
 
     def enter(self):
         if self.is_enabled():
-            self.pbar = tqdm(total=self.total)
+            self.pbar = self._progress_cls()(total=self.total, desc=self.desc)
+            if self.refresh_rate:
+                self._counter = _StripedCounter()
+                self._shown = 0
+                self._next_refresh = 0
         else:
             self.pbar = 0
         return self
 
     def exit(self):
-        if self.is_enabled():
+        counter = self._counter
+        if counter is not None:
+            self._refresh(counter, blocking=True)
+            self._counter = None
+            self.pbar.close()
+        elif self.is_enabled():
             self.pbar.close()
         else:
             self.pbar = 0
@@ -420,44 +1193,117 @@ class ProgressLoggable(Enterable, LockedLoggable):
 
 
 class TimedLoggable(Enterable, LockedLoggable):
+    """A logger that times a block of code.
+
+    Times are measured with ``perf_counter_ns``: `t1` and `t2` are the
+    counter at `enter` and `exit`, `elapsed_ns` their difference and `time`
+    the same as a `timedelta`. Every exit is recorded under the prefix in
+    `stats` (see :mod:`loggable.timing`), even if the level is disabled.
+    Blocks entered inside another on the same thread or task are recorded as
+    a call tree by `tracer`, under their prefix (or name if no prefix).
+    """
+
+    stats = timing.timings
+    tracer = timing.tracer
+    _span = None
+
     def __init__(
-        self, object_or_name, level, prefix="", format=None, log_colors=None, tqdm=tqdm
+        self,
+        object_or_name,
+        level,
+        prefix="",
+        format=None,
+        log_colors=None,
+        tqdm=None,
+        output=None,
+        file=None,
     ):
         super().__init__(
-            object_or_name, level, format=format, log_colors=log_colors, tqdm=tqdm
+            object_or_name,
+            level,
+            format=format,
+            log_colors=log_colors,
+            tqdm=tqdm,
+            output=output,
+            file=file,
         )
-        now = arrow.utcnow()
-        self.t1 = now
+        self.t1 = perf_counter_ns()
         self.t2 = None
+        self.elapsed_ns = None
         self.time = None
         self.prefix = prefix
 
-    def log(self, msg, level=None):
+    def log(self, msg, level=None, *args):
         if self.prefix:
-            msg = '{}("{}"): {}'.format(self.__class__.__name__, self.prefix, msg)
-        super().log(msg, level)
+            msg = LazyMessage(self._prefix_message, msg, args)
+            args = ()
+        super().log(msg, level, *args)
+
+    def _prefix_message(self, msg, args):
+        return '{}("{}"): {}'.format(
+            self.__class__.__name__, self.prefix, _render_message(msg, args)
+        )
 
     def enter(self):
-        now = arrow.utcnow()
-        self.t1 = now
-        self.log("Started at {}".format(self.t1))
+        self.log(partial(self._started_message, time.time()))
+        tracer = self.tracer
+        if tracer.enabled:
+            self._span = tracer.start(self.prefix or self.name)
+        self.t1 = perf_counter_ns()
         return self
 
+    @staticmethod
+    def _started_message(timestamp):
+        import arrow
+
+        return "Started at {}".format(arrow.get(timestamp))
+
     def exit(self):
-        t2 = arrow.utcnow()
-        self.t2 = t2
-        self.time = self.t2 - self.t1
-        self.log("Finished in {}.".format(self.time))
+        self.t2 = t2 = perf_counter_ns()
+        self.elapsed_ns = elapsed = t2 - self.t1
+        self.time = timedelta(microseconds=elapsed / 1000)
+        self.stats.record(self.prefix, elapsed)
+        span = self._span
+        if span is not None:
+            self._span = None
+            self.tracer.finish(span, self.t1, t2)
+        self.log(partial(self._finished_message, self.time))
         return self
 
+    @staticmethod
+    def _finished_message(elapsed):
+        return "Finished in {}.".format(elapsed)
+
+    def __getstate__(self):
+        d = super().__getstate__()
+        d.pop("_span", None)
+        return d
+
 
 class LoggableFactory(object):
-    def __init__(self, format=None, log_colors=None, tqdm=tqdm):
+    def __init__(
+        self,
+        format=None,
+        log_colors=None,
+        tqdm=None,
+        output=None,
+        shared=False,
+        file=None,
+    ):
         self.format = format
         self.log_colors = log_colors
         self._tqdm = tqdm
+        self.output = output
+        self.shared = shared
+        self.file = file
 
     def __call__(self, name):
         return Loggable(
-            name, format=self.format, log_colors=self.log_colors, tqdm=self._tqdm
+            name,
+            format=self.format,
+            log_colors=self.log_colors,
+            tqdm=self._tqdm,
+            output=self.output,
+            shared=self.shared,
+            file=self.file,
         )
@@ -0,0 +1,50 @@
+"""Filter and replay a binary log (see :mod:`loggable.binlog`)::
+
+python -m loggable app.lgb --since 2019-07-29T13:00 --level WARNING
+"""
+
+import argparse
+
+from loggable import Loggable
+from loggable.binlog import BinaryLogReader
+from loggable.formatters import OUTPUTS, new_formatter
+
+
+def _parse_time(value):
+    try:
+        return float(value)
+    except ValueError:
+        import arrow
+
+        return arrow.get(value).float_timestamp
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m loggable",
+        description="Filter and replay a binary log.",
+    )
+    parser.add_argument("path")
+    parser.add_argument("--since", type=_parse_time, help="epoch or ISO time")
+    parser.add_argument("--until", type=_parse_time, help="epoch or ISO time")
+    parser.add_argument("--level", help="min level, e.g. WARNING")
+    parser.add_argument("--name", help="glob pattern of logger names")
+    parser.add_argument("--output", choices=OUTPUTS, help="default is auto")
+    parser.add_argument(
+        "--count", action="store_true", help="only print the number of records"
+    )
+    args = parser.parse_args(argv)
+    level = args.level.upper() if args.level else None
+    with BinaryLogReader(args.path) as reader:
+        filters = dict(start=args.since, end=args.until, level=level, name=args.name)
+        if args.count:
+            print(sum(1 for _ in reader.offsets(**filters)))
+        else:
+            formatter = new_formatter(
+                args.output, Loggable.DEFAULT_FORMAT, Loggable.DEFAULT_COLORS
+            )
+            reader.replay(formatter, **filters)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""asyncio support for :class:`loggable.Loggable`.
+
+:meth:`Loggable.tqdm` and :class:`ProgressLoggable` wrap async iterables in
+an :class:`AsyncProgress`, so progress bars work with ``async for``, and
+loggers that are :class:`Enterable` can be used with ``async with``. Timed
+blocks are tracked per task (see :mod:`loggable.timing`).
+
+To keep slow terminal writes off the event loop, enable the background
+writer and await its shutdown:
+
+.. code-block:: python
+
+    enable_async(overflow="drop_oldest")
+    async for x in logger.tqdm(stream(), "INFO"):
+        logger.info("got %s", x)
+    await adisable_async()
+"""
+
+import sys
+
+
+def current_task():
+    """Return the asyncio task running in this thread, or None. asyncio is
+    not imported if it is not already."""
+    asyncio = sys.modules.get("asyncio")
+    if asyncio is None:
+        return None
+    try:
+        return asyncio.current_task()
+    except RuntimeError:  # no running loop
+        return None
+    except AttributeError:  # python < 3.7
+        return asyncio.Task.current_task()
+
+
+def in_event_loop():
+    """Whether this thread is running an asyncio event loop."""
+    asyncio = sys.modules.get("asyncio")
+    if asyncio is None:
+        return False
+    return asyncio._get_running_loop() is not None
+
+
+def is_async_iterable(obj):
+    return hasattr(obj, "__aiter__") and not hasattr(obj, "__iter__")
+
+
+class AsyncProgress(object):
+    """Advances a progress bar while an async iterable is iterated with
+    ``async for``. Like `tqdm`, an item is counted once the body of the loop
+    has run for it, and the bar is closed when the iterable is exhausted.
+    Other attributes are those of the progress bar.
+
+    :param iterable: the async iterable
+    :param pbar: the progress bar, e.g. a `tqdm` without iterable
+    """
+
+    def __init__(self, iterable, pbar):
+        self.iterable = iterable
+        self.pbar = pbar
+        self._iterator = None
+        self._started = False
+
+    def __aiter__(self):
+        self._iterator = self.iterable.__aiter__()
+        self._started = False
+        return self
+
+    async def __anext__(self):
+        if self._started:
+            self.pbar.update(1)
+        try:
+            x = await self._iterator.__anext__()
+        except StopAsyncIteration:
+            self.pbar.close()
+            raise
+        self._started = True
+        return x
+
+    def __getattr__(self, name):
+        return getattr(self.pbar, name)
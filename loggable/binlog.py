@@ -0,0 +1,404 @@
+"""Compact binary logs with a sidecar index.
+
+:class:`BinaryLogHandler` writes records to a binary log instead of text.
+Logger names and format strings are interned in a string table, so a record
+is a fixed-width header (time, level, name and format ids) followed by its
+args, typed. A sidecar index (``<path>.idx``) holds one fixed-width entry per
+record (time, level, name id, offset), so :class:`BinaryLogReader` filters by
+time, level and logger name by scanning the memory-mapped index only, and
+decodes just the matching records. Records can be replayed through any
+formatter, e.g. colored, from the command line (see :mod:`loggable.__main__`)::
+
+    python -m loggable app.lgb --level WARNING --name "Model*"
+
+.. code-block:: python
+
+    logger.add_handler(BinaryLogHandler("app.lgb"))
+    ...
+    for record in BinaryLogReader("app.lgb").records(level="ERROR"):
+        print(record.getMessage())
+"""
+
+import atexit
+import fnmatch
+import logging
+import mmap
+import os
+import struct
+import sys
+import threading
+
+from loggable.handlers import LoggableHandler
+from loggable.stacks import render_stack
+
+MAGIC = b"LGBIN1\n\x00"
+
+_STRING = 0x53  # "S"
+_RECORD = 0x52  # "R"
+
+# kind, id, length
+_STRING_HEADER = struct.Struct("<BII")
+# kind, length, created, level, name id, msg id, number of args
+_RECORD_HEADER = struct.Struct("<BIdHIIH")
+# created, level, name id (or string id), offset
+_INDEX_ENTRY = struct.Struct("<dHIQ")
+_LENGTH = struct.Struct("<I")
+_INT = struct.Struct("<q")
+_FLOAT = struct.Struct("<d")
+
+# message stored inline instead of in the string table
+_INLINE = 0xFFFFFFFF
+# level of index entries pointing at a string
+_STRING_LEVEL = 0xFFFF
+
+_INT_MIN, _INT_MAX = -(2**63), 2**63 - 1
+
+
+def _encode_str(s):
+    data = s.encode("utf-8", "backslashreplace")
+    return _LENGTH.pack(len(data)) + data
+
+
+def _is_scalar(x):
+    """Whether an arg is stored typed, and so replays as it was logged
+    (subclasses are not, as their formatting may differ)."""
+    t = type(x)
+    if t is int:
+        return _INT_MIN <= x <= _INT_MAX
+    return x is None or t is bool or t is float or t is str
+
+
+def _encode_arg(x):
+    if x is None:
+        return b"n"
+    if x is True or x is False:
+        return b"t" if x else b"F"
+    if type(x) is int:
+        return b"i" + _INT.pack(x)
+    if type(x) is float:
+        return b"f" + _FLOAT.pack(x)
+    return b"s" + _encode_str(x)
+
+
+class BinaryLogWriter(object):
+    """Appends records to a binary log and its index. Shared by every
+    :class:`BinaryLogHandler` of the same path (see :func:`binary_log`).
+
+    :param path: the path of the log; the index is written to `path` + ".idx"
+    :param buffer_size: size of the write buffers of the files
+    :param flush_level: records at or above this level are flushed at once
+    """
+
+    def __init__(self, path, buffer_size=1024 * 1024, flush_level=logging.ERROR):
+        self.path = os.path.abspath(path)
+        self.index_path = self.path + ".idx"
+        self.flush_level = logging._checkLevel(flush_level)
+        self.records_written = 0
+        self._lock = threading.Lock()
+        self._strings = {}
+        if os.path.exists(self.path) and os.path.getsize(self.path):
+            reader = BinaryLogReader(self.path)
+            try:
+                self._strings = {s: i for i, s in reader.strings.items()}
+            finally:
+                reader.close()
+        self._open(buffer_size)
+        if not self._offset:
+            self._file.write(MAGIC)
+            self._offset = len(MAGIC)
+
+    def _open(self, buffer_size):
+        self._file = open(self.path, "ab", buffering=buffer_size)
+        self._index = open(self.index_path, "ab", buffering=buffer_size)
+        self._offset = self._file.tell()
+
+    def configure(self, buffer_size=None, flush_level=None):
+        """Change options of the writer in place (see
+        :class:`BinaryLogWriter`). Changing the buffer size flushes and
+        reopens the files."""
+        with self._lock:
+            if flush_level is not None:
+                self.flush_level = logging._checkLevel(flush_level)
+            if buffer_size is not None and self._file is not None:
+                self._flush()
+                self._file.close()
+                self._index.close()
+                self._open(buffer_size)
+
+    def _write(self, data, created, level, name_id):
+        self._index.write(_INDEX_ENTRY.pack(created, level, name_id, self._offset))
+        self._file.write(data)
+        self._offset += len(data)
+
+    def _intern(self, s):
+        i = self._strings.get(s)
+        if i is None:
+            i = self._strings[s] = len(self._strings)
+            data = s.encode("utf-8", "backslashreplace")
+            self._write(
+                _STRING_HEADER.pack(_STRING, i, len(data)) + data, 0.0, _STRING_LEVEL, i
+            )
+        return i
+
+    def write(self, record):
+        """Append a record. Messages with scalar args (None, bool, int, float
+        and str) are stored as an interned format string and typed args, other
+        messages rendered inline."""
+        render_stack(record)
+        msg = record.msg
+        args = record.args
+        if (
+            not isinstance(msg, str)
+            or not isinstance(args, tuple)
+            or not all(_is_scalar(x) for x in args)
+        ):
+            msg, args = record.getMessage(), ()
+        exc_text = record.exc_text
+        if record.exc_info and not exc_text:
+            exc_text = logging.Formatter().formatException(record.exc_info)
+        level = min(record.levelno, _STRING_LEVEL - 1)
+        with self._lock:
+            if self._file is None:
+                raise ValueError("Cannot write to a closed BinaryLogWriter")
+            name_id = self._intern(record.name)
+            parts = []
+            if args:
+                msg_id = self._intern(msg)
+                parts.extend(_encode_arg(x) for x in args)
+            else:
+                msg_id = _INLINE
+                parts.append(_encode_str(msg))
+            parts.append(_encode_str(exc_text or ""))
+            parts.append(_encode_str(record.stack_info or ""))
+            body = b"".join(parts)
+            header = _RECORD_HEADER.pack(
+                _RECORD,
+                _RECORD_HEADER.size + len(body),
+                record.created,
+                level,
+                name_id,
+                msg_id,
+                len(args),
+            )
+            self._write(header + body, record.created, level, name_id)
+            self.records_written += 1
+            if record.levelno >= self.flush_level:
+                self._flush()
+
+    def _flush(self):
+        # the log is flushed first so the index never points past its end
+        self._file.flush()
+        self._index.flush()
+
+    def flush(self):
+        with self._lock:
+            if self._file is not None:
+                self._flush()
+
+    @property
+    def closed(self):
+        return self._file is None
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._flush()
+                self._file.close()
+                self._index.close()
+                self._file = self._index = None
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def binary_log(path, **options):
+    """Return the writer of a path, creating it if needed or if it was
+    closed. If options are given (see :class:`BinaryLogWriter`), an existing
+    writer is reconfigured in place, so the handlers writing to it keep
+    working."""
+    key = os.path.abspath(path)
+    with _writers_lock:
+        writer = _writers.get(key)
+        if writer is None or writer.closed:
+            writer = _writers[key] = BinaryLogWriter(key, **options)
+        elif options:
+            writer.configure(**options)
+        return writer
+
+
+def close_binary_logs():
+    """Flush and close every writer."""
+    with _writers_lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for writer in writers:
+        writer.close()
+
+
+atexit.register(close_binary_logs)
+
+
+class BinaryLogHandler(LoggableHandler):
+    """Writes records, unformatted, to a binary log.
+
+    :param path: the path of the log, whose :class:`BinaryLogWriter` is
+        shared by all handlers of the path
+    """
+
+    def __init__(self, path, level=logging.NOTSET):
+        super().__init__(level)
+        self.binlog = binary_log(path)
+
+    def emit(self, record):
+        try:
+            self.binlog.write(record)
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        self.binlog.flush()
+
+
+class BinaryLogReader(object):
+    """Reads a binary log by memory-mapping it and its index.
+
+    :param path: the path of the log
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        self._index_file = open(path + ".idx", "rb")
+        self._data = self._map(self._file)
+        self._index = self._map(self._index_file)
+        if self._data[: len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError("{} is not a binary log".format(path))
+        # ignore a partially written last index entry
+        n = len(self._index) // _INDEX_ENTRY.size
+        self._entries = memoryview(self._index)[: n * _INDEX_ENTRY.size]
+        self.strings = {}
+        for _, level, i, offset in _INDEX_ENTRY.iter_unpack(self._entries):
+            if level == _STRING_LEVEL:
+                _, _, length = _STRING_HEADER.unpack_from(self._data, offset)
+                start = offset + _STRING_HEADER.size
+                self.strings[i] = self._data[start : start + length].decode("utf-8")
+
+    @staticmethod
+    def _map(f):
+        if not os.fstat(f.fileno()).st_size:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        if getattr(self, "_entries", None) is not None:
+            self._entries.release()
+            self._entries = None
+        for m in (self._data, self._index):
+            if isinstance(m, mmap.mmap):
+                m.close()
+        self._file.close()
+        self._index_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def name_ids(self, pattern):
+        """Ids of the logger names matching a glob pattern."""
+        return {i for i, s in self.strings.items() if fnmatch.fnmatchcase(s, pattern)}
+
+    def offsets(self, start=None, end=None, level=None, name=None):
+        """Offsets of the records matching the filters, from the index.
+
+        :param start: min time (seconds since the epoch)
+        :param end: max time (excluded)
+        :param level: min level
+        :param name: glob pattern of logger names
+        """
+        level = logging._checkLevel(level) if level is not None else 0
+        names = self.name_ids(name) if name is not None else None
+        size = len(self._data)
+        for created, lvl, name_id, offset in _INDEX_ENTRY.iter_unpack(self._entries):
+            if offset >= size:
+                # the end of the log was not flushed yet
+                break
+            if (
+                lvl == _STRING_LEVEL
+                or lvl < level
+                or (start is not None and created < start)
+                or (end is not None and created >= end)
+                or (names is not None and name_id not in names)
+            ):
+                continue
+            yield offset
+
+    def records(self, **filters):
+        """Yield the records matching the filters (see :meth:`offsets`) as
+        `LogRecord` objects."""
+        for offset in self.offsets(**filters):
+            yield self.read(offset)
+
+    def _str(self, offset):
+        (length,) = _LENGTH.unpack_from(self._data, offset)
+        start = offset + _LENGTH.size
+        return self._data[start : start + length].decode("utf-8"), start + length
+
+    def read(self, offset):
+        """Decode the record at an offset of the log."""
+        data = self._data
+        _, _, created, level, name_id, msg_id, nargs = _RECORD_HEADER.unpack_from(
+            data, offset
+        )
+        pos = offset + _RECORD_HEADER.size
+        if msg_id == _INLINE:
+            msg, pos = self._str(pos)
+        else:
+            msg = self.strings[msg_id]
+        args = []
+        for _ in range(nargs):
+            tag = data[pos : pos + 1]
+            pos += 1
+            if tag == b"i":
+                args.append(_INT.unpack_from(data, pos)[0])
+                pos += _INT.size
+            elif tag == b"f":
+                args.append(_FLOAT.unpack_from(data, pos)[0])
+                pos += _FLOAT.size
+            elif tag == b"s":
+                s, pos = self._str(pos)
+                args.append(s)
+            else:
+                args.append({b"n": None, b"t": True, b"F": False}[tag])
+        exc_text, pos = self._str(pos)
+        stack_info, pos = self._str(pos)
+        return logging.makeLogRecord(
+            dict(
+                name=self.strings[name_id],
+                levelno=level,
+                levelname=logging.getLevelName(level),
+                msg=msg,
+                args=tuple(args),
+                created=created,
+                msecs=(created - int(created)) * 1000,
+                relativeCreated=(created - logging._startTime) * 1000,
+                exc_text=exc_text or None,
+                stack_info=stack_info or None,
+            )
+        )
+
+    def replay(self, formatter, file=None, **filters):
+        """Format the matching records and write them to `file` (default is
+        sys.stdout).
+
+        :return: the number of records written
+        """
+        file = file or sys.stdout
+        n = 0
+        for record in self.records(**filters):
+            file.write(formatter.format(record) + "\n")
+            n += 1
+        return n
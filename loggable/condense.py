@@ -0,0 +1,169 @@
+"""Condense large nested data before pretty printing it."""
+
+import math
+from itertools import islice
+
+from loggable.summarizers import summarize
+
+_SCALARS = (int, float, complex, bool, type(None))
+
+
+class Elided(object):
+    """Placeholder for data left out of condensed output. Its repr is its text,
+    so it is printed without quotes."""
+
+    __slots__ = ("text",)
+
+    def __init__(self, text="..."):
+        self.text = text
+
+    def __repr__(self):
+        return self.text
+
+    __str__ = __repr__
+
+
+class TruncatedRepr(object):
+    """Wraps a leaf object and prints at most `max_len` characters of its
+    string form, computed only when printed. Bytes are cut before they are
+    converted."""
+
+    __slots__ = ("obj", "max_len")
+
+    def __init__(self, obj, max_len):
+        self.obj = obj
+        self.max_len = max_len
+
+    def __repr__(self):
+        obj = self.obj
+        if isinstance(obj, (bytes, bytearray)) and len(obj) > self.max_len:
+            return "{}...({} more bytes)".format(
+                obj[: self.max_len], len(obj) - self.max_len
+            )
+        return _truncate(str(obj), self.max_len)
+
+    __str__ = __repr__
+
+
+def _truncate(s, max_len):
+    if len(s) > max_len:
+        return "{}...({} more)".format(s[:max_len], len(s) - max_len)
+    return s
+
+
+class _Condenser(object):
+    def __init__(self, max_list_len, max_depth, max_str_len, max_items):
+        self.max_list_len = max_list_len
+        self.max_depth = max_depth
+        self.max_str_len = max_str_len
+        self.budget = max_items
+
+    def condense(self, d, depth=0):
+        if isinstance(d, _SCALARS):
+            return d
+        if isinstance(d, str):
+            return _truncate(d, self.max_str_len)
+        if isinstance(d, (bytes, bytearray)):
+            if len(d) > self.max_str_len:
+                return TruncatedRepr(d, self.max_str_len)
+            return d
+        if isinstance(d, dict):
+            if depth >= self.max_depth:
+                return Elided("{...}")
+            return self._dict(d, depth + 1)
+        if isinstance(d, (list, tuple)):
+            if depth >= self.max_depth:
+                return Elided("[...]" if isinstance(d, list) else "(...)")
+            items = self._sequence(d, depth + 1)
+            return items if isinstance(d, list) else tuple(items)
+        if isinstance(d, (set, frozenset)):
+            if depth >= self.max_depth:
+                return Elided("{...}")
+            return type(d)(self._iterable(d, len(d), depth + 1))
+        summary = summarize(d, self.max_list_len)
+        if summary is not None:
+            return summary
+        return TruncatedRepr(d, self.max_str_len)
+
+    def _condense_items(self, items, depth):
+        """Condense items until the output budget runs out.
+
+        :return: the condensed items and the number of items consumed
+        """
+        condensed = []
+        condense = self.condense
+        for x in items:
+            if self.budget <= 0:
+                break
+            self.budget -= 1
+            condensed.append(condense(x, depth))
+        return condensed, len(condensed)
+
+    def _dict(self, d, depth):
+        items, n = self._condense_items(d.values(), depth)
+        condensed = {}
+        for key, item in zip(d, items):
+            condensed[self._key(key, condensed)] = item
+        if n < len(d):
+            condensed[Elided()] = Elided("{} more".format(len(d) - n))
+        return condensed
+
+    def _key(self, key, condensed):
+        """Cut a long str or bytes key, keeping distinct keys distinct."""
+        max_len = self.max_str_len
+        if isinstance(key, str) and len(key) > max_len:
+            cut = _truncate(key, max_len)
+            return Elided(repr(cut)) if cut in condensed else cut
+        if isinstance(key, (bytes, bytearray)) and len(key) > max_len:
+            return TruncatedRepr(key, max_len)
+        return key
+
+    def _sequence(self, d, depth):
+        length = len(d)
+        if length > self.max_list_len:
+            g = self.max_list_len / 2
+            head, tail = math.floor(g), math.ceil(g)
+            items, head = self._condense_items(d[:head], depth)
+            tail_items, tail = self._condense_items(d[length - tail :], depth)
+        else:
+            items, head = self._condense_items(d, depth)
+            tail_items, tail = [], 0
+        if head + tail < length:
+            items.append(Elided("...({} more)".format(length - head - tail)))
+        items.extend(tail_items)
+        return items
+
+    def _iterable(self, d, length, depth):
+        items, n = self._condense_items(islice(d, self.max_list_len), depth)
+        if n < length:
+            items.append(Elided("...({} more)".format(length - n)))
+        return items
+
+
+def condense_long_lists(
+    d, max_list_len=20, max_depth=10, max_str_len=1000, max_items=10000
+):
+    """
+    Condense the long lists in a dictionary
+
+    Works in a single pass over the data that is kept: long lists and tuples
+    keep their first and last items, sets their first `max_list_len` items,
+    and once `max_items` items have been kept the rest of every container is
+    elided. Strings are cut to `max_str_len` characters. NumPy arrays and
+    pandas objects are summarized (see :mod:`loggable.summarizers`), and other
+    objects are wrapped so that only the first `max_str_len` characters of
+    their string form are printed. Iterators and generators are never consumed.
+
+    :param d: dictionary to condense
+    :type d: dict
+    :param max_list_len: max length of lists to display
+    :type max_list_len: int
+    :param max_depth: max depth of nested containers to display
+    :type max_depth: int
+    :param max_str_len: max length of strings to display
+    :type max_str_len: int
+    :param max_items: max number of items to display in total
+    :type max_items: int
+    :return: the condensed data
+    """
+    return _Condenser(max_list_len, max_depth, max_str_len, max_items).condense(d)
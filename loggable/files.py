@@ -0,0 +1,351 @@
+"""Batched, rotating and compressed log files.
+
+A :class:`FileSink` buffers formatted records and writes them to its file
+in large blocks: when `buffer_size` bytes are buffered, when a record at or
+above `flush_level` arrives, or every `flush_interval` seconds. The file is
+rotated by size and/or age, and rotated segments are gzipped on a background
+thread, so logging threads never wait for compression.
+
+Sinks are shared per path. A Loggable writes to one with the `file` option,
+through its own :class:`FileSinkHandler`, so loggers keep their own levels:
+
+.. code-block:: python
+
+    file_sink("app.log", max_bytes=100 * 2 ** 20, backup_count=10)
+    logger = Loggable("MyLogger", file="app.log")
+    ...
+    file_sink("app.log").metrics()
+"""
+
+import atexit
+import glob
+import gzip
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+from collections import deque
+
+from loggable.handlers import LoggableHandler
+from loggable.timing import TimingStats, perf_counter_ns
+
+_sinks = {}
+_sinks_lock = threading.Lock()
+
+# rotated segments are named <path>.<YYYYmmdd-HHMMSS>-<NNNNNN>[.gz]
+_SEGMENT_SUFFIX = r"\.\d{8}-\d{6}-\d{6}(\.gz)?"
+_OPTIONS = (
+    "buffer_size",
+    "flush_interval",
+    "flush_level",
+    "max_bytes",
+    "rotate_interval",
+    "backup_count",
+    "compress",
+    "encoding",
+)
+
+
+class FileSink(object):
+    """Writes text to a file in blocks, rotating and compressing it.
+
+    :param path: the path of the file
+    :param buffer_size: number of buffered bytes that triggers a write
+    :param flush_interval: max number of seconds text stays buffered
+    :param flush_level: records at or above this level are written at once
+    :param max_bytes: rotate the file once it reaches this size
+    :param rotate_interval: rotate the file once it is this many seconds old
+    :param backup_count: number of rotated segments to keep (all if None)
+    :param compress: whether to gzip rotated segments
+    :param encoding: the encoding of the file
+    """
+
+    def __init__(
+        self,
+        path,
+        buffer_size=64 * 1024,
+        flush_interval=1.0,
+        flush_level=logging.ERROR,
+        max_bytes=None,
+        rotate_interval=None,
+        backup_count=None,
+        compress=True,
+        encoding="utf-8",
+    ):
+        self.path = os.path.abspath(path)
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.flush_level = logging._checkLevel(flush_level)
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_interval
+        self.backup_count = backup_count
+        self.compress = compress
+        self.encoding = encoding
+
+        self.bytes_written = 0
+        self.records_written = 0
+        self.flushes = 0
+        self.rotations = 0
+        self.compressed = 0
+        self.errors = 0
+        self.flush_latency = TimingStats()
+
+        self._buffer = []
+        self._buffered = 0
+        self._buffered_records = 0
+        self._lock = threading.RLock()
+        self._file = None
+        self._opened = None
+        self._size = 0
+        self._segments = 0
+        self._compress_queue = deque()
+        self._compress_ready = threading.Condition(threading.Lock())
+        self._closed = threading.Event()
+        self._open()
+        self._flusher = threading.Thread(
+            target=self._run_flusher, name="loggable-file-flusher", daemon=True
+        )
+        self._flusher.start()
+        self._compressor = None
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._file = open(self.path, "ab")
+        self._size = self._file.tell()
+        self._opened = time.time()
+
+    def configure(self, **options):
+        """Change options of the sink in place (see :class:`FileSink`). The
+        text buffered so far is written first.
+        """
+        unknown = set(options).difference(_OPTIONS)
+        if unknown:
+            raise TypeError(
+                "Unknown FileSink options: {}".format(", ".join(sorted(unknown)))
+            )
+        if "flush_level" in options:
+            options["flush_level"] = logging._checkLevel(options["flush_level"])
+        with self._lock:
+            self._flush()
+            for name, value in options.items():
+                setattr(self, name, value)
+
+    def write(self, text, level=logging.NOTSET):
+        """Buffer the text of a record (a newline is appended)."""
+        data = (text + "\n").encode(self.encoding)
+        with self._lock:
+            if self._file is None:
+                raise ValueError("Cannot write to a closed FileSink")
+            self._buffer.append(data)
+            self._buffered += len(data)
+            self._buffered_records += 1
+            if self._buffered >= self.buffer_size or level >= self.flush_level:
+                self._flush()
+
+    def flush(self):
+        """Write the buffered text to the file."""
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if self._buffer and self._file is not None:
+            t1 = perf_counter_ns()
+            data = b"".join(self._buffer)
+            try:
+                self._file.write(data)
+                self._file.flush()
+            except (OSError, ValueError):
+                self.errors += 1
+            else:
+                self._size += len(data)
+                self.bytes_written += len(data)
+                self.records_written += self._buffered_records
+            self._buffer = []
+            self._buffered = 0
+            self._buffered_records = 0
+            self.flushes += 1
+            self.flush_latency.add(perf_counter_ns() - t1)
+        if self._should_rotate():
+            self._rotate()
+
+    def _should_rotate(self):
+        if self._file is None or not self._size:
+            return False
+        if self.max_bytes is not None and self._size >= self.max_bytes:
+            return True
+        return (
+            self.rotate_interval is not None
+            and time.time() - self._opened >= self.rotate_interval
+        )
+
+    def _rotate(self):
+        self._file.close()
+        self._segments += 1
+        rotated = "{}.{}-{:06d}".format(
+            self.path, time.strftime("%Y%m%d-%H%M%S"), self._segments
+        )
+        if self.compress:
+            # renamed and queued at once, so _prune never sees it unqueued
+            with self._compress_ready:
+                os.rename(self.path, rotated)
+                self._queue_compression(rotated)
+        else:
+            os.rename(self.path, rotated)
+        self.rotations += 1
+        self._open()
+        if not self.compress:
+            self._prune()
+
+    def _queue_compression(self, path):
+        # called with _compress_ready held
+        self._compress_queue.append(path)
+        if self._compressor is None:
+            self._compressor = threading.Thread(
+                target=self._run_compressor,
+                name="loggable-file-compressor",
+                daemon=True,
+            )
+            self._compressor.start()
+        self._compress_ready.notify()
+
+    def _run_compressor(self):
+        while True:
+            with self._compress_ready:
+                while not self._compress_queue:
+                    if self._closed.is_set():
+                        return
+                    self._compress_ready.wait()
+                path = self._compress_queue[0]
+            try:
+                with open(path, "rb") as f, gzip.open(path + ".gz", "wb") as gz:
+                    shutil.copyfileobj(f, gz)
+                os.remove(path)
+                self.compressed += 1
+            except OSError:
+                self.errors += 1
+            with self._compress_ready:
+                self._compress_queue.popleft()
+                self._compress_ready.notify_all()
+            self._prune()
+
+    def _prune(self):
+        if self.backup_count is None:
+            return
+        pattern = re.compile(re.escape(os.path.basename(self.path)) + _SEGMENT_SUFFIX)
+        with self._compress_ready:
+            pending = set(self._compress_queue)
+            segments = [
+                s
+                for s in glob.glob(glob.escape(self.path) + ".*")
+                if pattern.fullmatch(os.path.basename(s))
+                and s not in pending
+                and s[:-3] not in pending
+            ]
+        segments.sort(key=os.path.getmtime)
+        for segment in segments[: max(len(segments) - self.backup_count, 0)]:
+            try:
+                os.remove(segment)
+            except OSError:
+                self.errors += 1
+
+    def _run_flusher(self):
+        while not self._closed.wait(self.flush_interval):
+            with self._lock:
+                self._flush()
+
+    def wait_for_compression(self, timeout=None):
+        """Block until the rotated segments queued so far are compressed.
+
+        :return: False on timeout
+        """
+        with self._compress_ready:
+            return self._compress_ready.wait_for(
+                lambda: not self._compress_queue, timeout
+            )
+
+    def metrics(self):
+        """Return counters for monitoring, latencies are in nanoseconds."""
+        with self._lock:
+            latency = self.flush_latency.as_dict()
+            return dict(
+                bytes_written=self.bytes_written,
+                records_written=self.records_written,
+                buffered_bytes=self._buffered,
+                flushes=self.flushes,
+                flush_latency_mean=latency["mean"],
+                flush_latency_p99=latency["p99"],
+                flush_latency_max=latency["max"],
+                rotations=self.rotations,
+                compressed=self.compressed,
+                pending_compression=len(self._compress_queue),
+                errors=self.errors,
+            )
+
+    @property
+    def closed(self):
+        return self._closed.is_set()
+
+    def close(self):
+        """Write the buffered text, finish compressing and close the file."""
+        with self._lock:
+            if self._closed.is_set():
+                return
+            self._flush()
+            self._closed.set()
+            self._file.close()
+            self._file = None
+        with self._compress_ready:
+            self._compress_ready.notify_all()
+        if self._compressor is not None:
+            self._compressor.join()
+        self._flusher.join()
+
+    def __repr__(self):
+        return "<{} {}>".format(self.__class__.__name__, self.path)
+
+
+def file_sink(path, **options):
+    """Return the sink of a path, creating it if needed or if it was closed.
+    If options are given (see :class:`FileSink`), an existing sink is
+    reconfigured in place, so the handlers writing to it keep working."""
+    key = os.path.abspath(path)
+    with _sinks_lock:
+        sink = _sinks.get(key)
+        if sink is None or sink.closed:
+            sink = _sinks[key] = FileSink(key, **options)
+        elif options:
+            sink.configure(**options)
+        return sink
+
+
+def close_sinks():
+    """Flush and close every sink."""
+    with _sinks_lock:
+        sinks = list(_sinks.values())
+        _sinks.clear()
+    for sink in sinks:
+        sink.close()
+
+
+atexit.register(close_sinks)
+
+
+class FileSinkHandler(LoggableHandler):
+    """Formats records and writes them to a :class:`FileSink`."""
+
+    def __init__(self, sink, level=logging.NOTSET):
+        super().__init__(level)
+        self.sink = sink
+
+    def emit(self, record):
+        try:
+            self.sink.write(self.format(record), record.levelno)
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        self.sink.flush()
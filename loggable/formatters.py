@@ -0,0 +1,273 @@
+"""Formatters for :class:`loggable.Loggable` output.
+
+:class:`PlainFormatter` and :class:`JSONFormatter` are meant for output that
+does not go to a terminal (files, pipes, log collectors), and
+:class:`ColorFormatter` for terminals. They compile their layout once, so
+formatting a record costs a single attribute fetch and one string
+interpolation. Times are rendered once per second, and the header of plain
+and colored lines (colors, level and logger name) once per logger and level.
+"""
+
+import logging
+import re
+from abc import ABC, abstractmethod
+import sys
+import time
+from json.encoder import encode_basestring_ascii
+from operator import attrgetter
+
+COLOR = "color"
+PLAIN = "plain"
+JSON = "json"
+OUTPUTS = (COLOR, PLAIN, JSON)
+
+_FIELD = re.compile(r"%\((\w+)\)([#0+ -]*\d*(?:\.\d+)?[diouxXeEfFgGcrsa])")
+
+
+# fields of every record, which are never colors
+_RECORD_FIELDS = frozenset(logging.LogRecord("", 0, "", 0, "", (), None).__dict__) | {
+    "message",
+    "asctime",
+}
+
+
+def _is_color_field(name):
+    if name == "log_color" or name.endswith("_log_color"):
+        return True
+    if name in _RECORD_FIELDS:
+        return False
+    # other fields may be colorlog escape codes, e.g. %(reset)s
+    from colorlog.escape_codes import escape_codes
+
+    return name in escape_codes
+
+
+class _CompiledFormatter(logging.Formatter, ABC):
+    """Formatter whose layout is rendered by `_render(record)`."""
+
+    _time_cache = None  # (second, datefmt, rendered time)
+
+    @abstractmethod
+    def _render(self, record):
+        """Render the layout of a record, without exception and stack."""
+
+    def format(self, record):
+        record.message = record.getMessage()
+        if self._uses_time:
+            record.asctime = self.formatTime(record, self.datefmt)
+        s = self._render(record)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            s = self._append(s, "exc_text", record.exc_text)
+        if record.stack_info:
+            s = self._append(s, "stack_info", self.formatStack(record.stack_info))
+        return s
+
+    def formatTime(self, record, datefmt=None):
+        # records of a burst share their second, so the date is rendered once
+        # per second and only the milliseconds are added per record
+        second = int(record.created)
+        cached = self._time_cache
+        if cached is None or cached[0] != second or cached[1] != datefmt:
+            date = time.strftime(
+                datefmt or self.default_time_format, self.converter(record.created)
+            )
+            cached = self._time_cache = (second, datefmt, date)
+        if datefmt or not self.default_msec_format:
+            return cached[2]
+        return self.default_msec_format % (cached[2], record.msecs)
+
+    def _append(self, s, field, text):
+        return s + "\n" + text
+
+
+class PlainFormatter(_CompiledFormatter):
+    """Formats records with a %-style format, without colors.
+
+    Color fields of a colorlog format (e.g. ``%(log_color)s``) are dropped, so
+    the same format can be used for colored and plain output. The format is
+    compiled into a positional template and an `attrgetter` for its fields.
+    The fields that only depend on the logger and level of a record (see
+    `HEADER_FIELDS`) are rendered into a template of their own once per
+    logger and level, so a record only renders the rest, e.g. its time and
+    message.
+    """
+
+    HEADER_FIELDS = ("name", "levelname", "levelno")
+    # max number of cached header templates, cleared when reached
+    MAX_HEADERS = 1024
+    _colored = False
+
+    def __init__(self, fmt=None, datefmt=None):
+        fmt = fmt or "%(levelname)s - %(name)s - %(asctime)s - %(message)s"
+        super().__init__(fmt, datefmt)
+        self._parts = []  # literal text and (field, spec, is header) tuples
+        last = 0
+        for match in _FIELD.finditer(fmt):
+            self._parts.append(fmt[last : match.start()])
+            name, spec = match.groups()
+            color = _is_color_field(name)
+            if not color or self._colored:
+                header = color or name in self.HEADER_FIELDS
+                self._parts.append((name, spec, header))
+            last = match.end()
+        self._parts.append(fmt[last:])
+        fields = [p for p in self._parts if isinstance(p, tuple)]
+        keys = {name for name, _, _ in fields if name in self.HEADER_FIELDS}
+        if self._colored:
+            keys.add("levelname")  # the colors depend on the level
+        self._key = _getter(sorted(keys))
+        self._getter = _getter([name for name, _, header in fields if not header])
+        self._templates = {}
+        self._uses_time = "asctime" in (name for name, _, _ in fields)
+
+    def _header_value(self, record, name):
+        return getattr(record, name)
+
+    def _new_template(self, record, key):
+        parts = []
+        for part in self._parts:
+            if not isinstance(part, tuple):
+                parts.append(part)
+            elif part[2]:
+                value = ("%" + part[1]) % self._header_value(record, part[0])
+                parts.append(value.replace("%", "%%"))
+            else:
+                parts.append("%" + part[1])
+        template = "".join(parts)
+        templates = self._templates
+        if len(templates) >= self.MAX_HEADERS:
+            templates.clear()
+        templates[key] = template
+        return template
+
+    def _render(self, record):
+        key = self._key(record)
+        template = self._templates.get(key)
+        if template is None:
+            template = self._new_template(record, key)
+        return template % self._getter(record)
+
+
+class ColorFormatter(PlainFormatter):
+    """Formats records with a colorlog %-style format, like a
+    ``colorlog.ColoredFormatter`` (with its default `reset`), but with the
+    colors and the header rendered once per logger and level.
+
+    :param log_colors: level names to colorlog color names
+    """
+
+    _colored = True
+
+    def __init__(self, fmt=None, datefmt=None, log_colors=None):
+        from colorlog.escape_codes import escape_codes, parse_colors
+
+        self._escape_codes = escape_codes
+        self._parse_colors = parse_colors
+        self.log_colors = log_colors or {}
+        super().__init__(fmt, datefmt)
+        self._reset = escape_codes["reset"]
+
+    def _header_value(self, record, name):
+        if name == "log_color":
+            return self._parse_colors(self.log_colors.get(record.levelname, ""))
+        if name.endswith("_log_color"):
+            return ""  # secondary colors are not supported
+        if name in self._escape_codes:
+            return self._escape_codes[name]
+        return getattr(record, name)
+
+    def _render(self, record):
+        s = super()._render(record)
+        if not s.endswith(self._reset):
+            s += self._reset
+        return s
+
+
+def _getter(fields):
+    """Return a function of a record returning the tuple of `fields`."""
+    if len(fields) == 1:
+        getter = attrgetter(fields[0])
+        return lambda record: (getter(record),)
+    if fields:
+        return attrgetter(*fields)
+    return lambda record: ()
+
+
+class JSONFormatter(_CompiledFormatter):
+    """Formats records as JSON lines with a fixed field order.
+
+    :param fields: the record attributes to write, in order. ``"asctime"`` and
+        ``"message"`` are rendered as for any formatter.
+    """
+
+    DEFAULT_FIELDS = ("created", "levelname", "name", "message")
+
+    def __init__(self, fields=None, datefmt=None):
+        super().__init__(None, datefmt)
+        self.fields = tuple(fields or self.DEFAULT_FIELDS)
+        self._template = (
+            "{"
+            + ", ".join(
+                encode_basestring_ascii(f).replace("%", "%%") + ": %s"
+                for f in self.fields
+            )
+            + "}"
+        )
+        self._getters = tuple(attrgetter(f) for f in self.fields)
+        self._uses_time = "asctime" in self.fields
+
+    @staticmethod
+    def _encode(value):
+        if isinstance(value, str):
+            return encode_basestring_ascii(value)
+        if value is None:
+            return "null"
+        if value is True:
+            return "true"
+        if value is False:
+            return "false"
+        if isinstance(value, (int, float)):
+            return repr(value)
+        return encode_basestring_ascii(str(value))
+
+    def _render(self, record):
+        encode = self._encode
+        return self._template % tuple(encode(get(record)) for get in self._getters)
+
+    def _append(self, s, field, text):
+        # exceptions and stacks are extra fields of the same line
+        return "{}, {}: {}}}".format(
+            s[:-1], encode_basestring_ascii(field), encode_basestring_ascii(text)
+        )
+
+
+def isatty(stream):
+    """Whether the stream is an interactive terminal."""
+    try:
+        return stream.isatty()
+    except (AttributeError, ValueError):
+        return False
+
+
+def new_formatter(output=None, fmt=None, log_colors=None, stream=None):
+    """Create the formatter for an output mode.
+
+    :param output: one of ``"color"``, ``"plain"`` or ``"json"``. If None,
+        ``"color"`` is used if `stream` is a terminal and ``"plain"`` otherwise.
+    :param fmt: the %-style format for color and plain output
+    :param log_colors: the log colors for color output
+    :param stream: the stream output is written to. Default is sys.stdout.
+    """
+    if output is None:
+        output = COLOR if isatty(stream or sys.stdout) else PLAIN
+    if output == COLOR:
+        return ColorFormatter(fmt, log_colors=log_colors)
+    if output == PLAIN:
+        return PlainFormatter(fmt)
+    if output == JSON:
+        return JSONFormatter()
+    raise ValueError(
+        "Output '{}' not recognized. Select from {}".format(output, OUTPUTS)
+    )
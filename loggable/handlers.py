@@ -0,0 +1,673 @@
+"""Handlers used by :class:`loggable.Loggable`."""
+
+import atexit
+import logging
+import sys
+import threading
+import time
+from collections import deque
+from itertools import count
+from operator import itemgetter
+
+from loggable.aio import in_event_loop
+from loggable.metrics import log_metrics
+from loggable.stacks import STACK_FRAMES, render_stack
+from loggable.timing import perf_counter_ns
+
+_generations = count(1)
+
+
+def tqdm_class(tqdm=None):
+    """Return `tqdm`, or by default the `tqdm.tqdm` class, which is only
+    imported once a progress bar is needed."""
+    if tqdm is None:
+        from tqdm import tqdm
+    return tqdm
+
+
+class _StdoutWrite(object):
+    """Stands in for `tqdm.tqdm` until tqdm is imported: without any progress
+    bar, `tqdm.write` is a write to stdout."""
+
+    @staticmethod
+    def write(s, file=None, end="\n"):
+        fp = file if file is not None else sys.stdout
+        fp.write(s)
+        fp.write(end)
+
+
+class LoggableHandler(logging.Handler):
+    """Base class for handlers managed by a :class:`Loggable`.
+
+    Every configuration change (level, tb_limit) stamps the handler with a new
+    ``generation``. Loggables cache the state they resolve from a handler and
+    consider it valid only while the generation is unchanged, so a change
+    costs the same however many Loggables use the handler: each resolves its
+    state again, and rebinds its level methods, the next time it is used.
+    """
+
+    repeats = None  # a _Repeats while repeated records are collapsed
+    level_stamp = 0  # stamp of the last Loggable level setting applied
+    ancestors = frozenset()  # ids of the Loggables whose levels are inherited
+
+    def __init__(self, level=logging.NOTSET):
+        self.generation = next(_generations)
+        self._tb_limit = 0
+        super().__init__(level)
+
+    def collapse_repeats(self, interval=1.0):
+        """Hold back consecutive records with the same logger, level and
+        message, and write a single "last message repeated N times" record
+        instead, when a different record arrives, when the handler is closed
+        or `interval` seconds after the first held record. Records with an
+        exception or a stack are never held. Use None to write every record.
+        """
+        self.flush_repeats()
+        self.repeats = None if interval is None else _Repeats(interval)
+        return self
+
+    def flush_repeats(self):
+        """Write the summary of the records held back so far, if any."""
+        repeats = self.repeats
+        if repeats is not None:
+            self.acquire()
+            try:
+                self._write_repeats(repeats)
+            finally:
+                self.release()
+
+    def _write_repeats(self, repeats):
+        if repeats.timer is not None:
+            repeats.timer.cancel()
+            repeats.timer = None
+        if repeats.count:
+            summary = logging.makeLogRecord(repeats.record.__dict__)
+            summary.msg = "last message repeated %d times"
+            summary.args = (repeats.count,)
+            summary.__dict__.pop(STACK_FRAMES, None)
+            repeats.count = 0
+            self.emit(summary)
+
+    def handle(self, record):
+        repeats = self.repeats
+        if repeats is None:
+            return super().handle(record)
+        rv = self.filter(record)
+        if isinstance(rv, logging.LogRecord):
+            record = rv
+        if rv:
+            self.acquire()
+            try:
+                if repeats.repeated(record):
+                    repeats.count += 1
+                    repeats.record = record
+                    if repeats.timer is None:
+                        repeats.timer = threading.Timer(
+                            repeats.interval, self.flush_repeats
+                        )
+                        repeats.timer.daemon = True
+                        repeats.timer.start()
+                else:
+                    self._write_repeats(repeats)
+                    self.emit(record)
+            finally:
+                self.release()
+        return rv
+
+    def close(self):
+        self.flush_repeats()
+        super().close()
+
+    def handle_many(self, records):
+        """Handle records in order, skipping those below the level of the
+        handler. Subclasses may write them as one batch."""
+        level = self.level
+        for record in records:
+            if record.levelno >= level:
+                self.handle(record)
+
+    def invalidate(self):
+        """Mark any state cached from this handler as stale."""
+        self.generation = next(_generations)
+
+    def setLevel(self, level):
+        super().setLevel(level)
+        self.invalidate()
+
+    def format(self, record):
+        # stacks captured with a tb_limit are rendered only when written
+        render_stack(record)
+        return super().format(record)
+
+    @property
+    def tb_limit(self):
+        return self._tb_limit
+
+    @tb_limit.setter
+    def tb_limit(self, limit):
+        self._tb_limit = limit
+        self.invalidate()
+
+
+def _metrics_name(record):
+    # records of shared loggers are shown under their instance name
+    return record.__dict__.get("logger_name", record.name)
+
+
+def _count_written(log_metrics, written, lines, write_ns):
+    """Count lines written together, sharing the time of the write."""
+    if log_metrics.enabled and written:
+        write_ns //= len(written)
+        for (record, format_ns), line in zip(written, lines):
+            log_metrics.count_written(
+                _metrics_name(record),
+                record.levelno,
+                len(line) + 1,
+                format_ns,
+                write_ns,
+            )
+
+
+class _Repeats(object):
+    """The last record written by a handler and the repeats held back."""
+
+    __slots__ = (
+        "interval",
+        "name",
+        "levelno",
+        "hash",
+        "message",
+        "record",
+        "count",
+        "timer",
+    )
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.name = self.levelno = self.hash = self.message = None
+        self.record = None
+        self.count = 0
+        self.timer = None
+
+    def repeated(self, record):
+        """Whether `record` repeats the last record, which it becomes if not."""
+        if record.exc_info or record.stack_info or STACK_FRAMES in record.__dict__:
+            self.message = None
+            return False
+        message = record.getMessage()
+        # the hash of a str is cached, so most mismatches cost no comparison
+        h = hash(message)
+        if (
+            h == self.hash
+            and record.levelno == self.levelno
+            and record.name == self.name
+            and message == self.message
+        ):
+            return True
+        self.name = record.name
+        self.levelno = record.levelno
+        self.hash = h
+        self.message = message
+        return False
+
+
+class TqdmLoggingHandler(LoggableHandler):
+    """Writes records with `tqdm.write` so they do not break progress bars.
+
+    If `writer` is set (see :func:`enable_async`), records are handed to the
+    :class:`AsyncWriter` instead of being formatted and written on the calling
+    thread. Written records are counted in `log_metrics` (see
+    :mod:`loggable.metrics`).
+    """
+
+    writer = None
+    log_metrics = log_metrics
+
+    def __init__(self, level=logging.NOTSET, tqdm=None):
+        super().__init__(level)
+        self._tqdm_cls = tqdm
+        self.tb_limit = 0
+
+    @property
+    def _tqdm(self):
+        # tqdm is not imported for writing: until something else imports it
+        # there is no progress bar to write around
+        if self._tqdm_cls is not None:
+            return self._tqdm_cls
+        module = sys.modules.get("tqdm")
+        return getattr(module, "tqdm", _StdoutWrite)
+
+    def emit(self, record):
+        try:
+            writer = self.writer
+            if writer is not None:
+                writer.put(self, record)
+                return
+            t1 = perf_counter_ns()
+            msg = self.format(record)
+            t2 = perf_counter_ns()
+            self._tqdm.write(msg)
+            self.flush()
+            log_metrics = self.log_metrics
+            if log_metrics.enabled:
+                log_metrics.count_written(
+                    _metrics_name(record),
+                    record.levelno,
+                    len(msg) + 1,
+                    t2 - t1,
+                    perf_counter_ns() - t2,
+                )
+        except (KeyboardInterrupt, SystemExit):
+            raise
+        except:
+            self.handleError(record)
+
+    def handle_many(self, records):
+        """Format the records and write them with a single `tqdm.write`,
+        unless they are collapsed or written asynchronously."""
+        if self.repeats is not None or self.writer is not None:
+            return super().handle_many(records)
+        level = self.level
+        lines = []
+        written = []  # (record, format time) of each line
+        for record in records:
+            if record.levelno < level:
+                continue
+            rv = self.filter(record)
+            if isinstance(rv, logging.LogRecord):
+                record = rv
+            if rv:
+                try:
+                    t1 = perf_counter_ns()
+                    lines.append(self.format(record))
+                    written.append((record, perf_counter_ns() - t1))
+                except Exception:
+                    self.handleError(record)
+        if lines:
+            self.acquire()
+            try:
+                t1 = perf_counter_ns()
+                self._tqdm.write("\n".join(lines))
+                self.flush()
+                _count_written(self.log_metrics, written, lines, perf_counter_ns() - t1)
+            except (KeyboardInterrupt, SystemExit):
+                raise
+            except Exception:
+                self.handleError(records[-1])
+            finally:
+                self.release()
+
+    def flush(self):
+        writer = self.writer
+        if writer is not None:
+            writer.flush()
+
+
+class FlightRecorder(LoggableHandler):
+    """Keeps the last `capacity` records, at every level down to
+    `capture_level`, and writes them through `target` once a record at or
+    above `trigger_level` arrives, or when :meth:`dump` is called.
+
+    Records below the level of their :class:`Loggable` never become
+    `LogRecord` objects: the Loggable hands their raw fields (name, level,
+    message, args, time) to :meth:`capture`, which stores them as a tuple in
+    a preallocated ring buffer. Messages and args are only rendered if they
+    are dumped. Records that were already written by the logger's other
+    handlers are kept for ordering but not written again.
+
+    The level of a flight recorder is its capture level. It does not follow
+    :meth:`Loggable.set_level`.
+
+    :param capacity: number of records kept
+    :param trigger_level: level of the records that trigger a dump
+    :param capture_level: lowest level of the records kept
+    :param target: the handler records are dumped through
+    """
+
+    follows_level = False
+
+    def __init__(
+        self,
+        capacity=1000,
+        trigger_level=logging.ERROR,
+        capture_level=logging.DEBUG,
+        target=None,
+    ):
+        super().__init__(capture_level)
+        self.capacity = capacity
+        self.trigger_level = logging._checkLevel(trigger_level)
+        self.target = target
+        self._buffer = [None] * capacity
+        self._next = count()
+        self._start = 0
+        self._dump_lock = threading.Lock()
+
+    def capture(self, name, level, msg, args, extra=None):
+        """Store the raw fields of a record that is not written otherwise."""
+        # next() on a count is atomic, so concurrent captures get their own slot
+        i = next(self._next)
+        self._buffer[i % self.capacity] = (
+            i,
+            name,
+            level,
+            msg,
+            args,
+            time.time(),
+            threading.get_ident(),
+            extra,
+        )
+
+    def emit(self, record):
+        if record.levelno >= self.trigger_level:
+            self.dump()
+        else:
+            i = next(self._next)
+            self._buffer[i % self.capacity] = (i, record)
+
+    def records(self):
+        """Remove the buffered records and return them, oldest first, as
+        `LogRecord` objects. Records already written are left out."""
+        with self._dump_lock:
+            start = self._start
+            end = self._start = next(self._next)
+        entries = sorted(
+            (e for e in self._buffer if e is not None and start <= e[0] < end),
+            key=itemgetter(0),
+        )
+        return [self._make_record(e) for e in entries if len(e) > 2]
+
+    @staticmethod
+    def _make_record(entry):
+        _, name, level, msg, args, created, thread, extra = entry
+        record = logging.LogRecord(name, level, "", 0, msg, args, None)
+        record.created = created
+        record.msecs = (created - int(created)) * 1000
+        record.relativeCreated = (created - logging._startTime) * 1000
+        record.thread = thread
+        if extra:
+            record.__dict__.update(extra)
+            record.name = extra.get("instance_name", name)
+        return record
+
+    def dump(self):
+        """Write the buffered records through the target handler and clear
+        the buffer. They are preceded by a header at the highest of their
+        levels.
+
+        :return: the number of records written
+        """
+        records = self.records()
+        target = self.target
+        if target is not None and records:
+            header = logging.LogRecord(
+                records[-1].name,
+                max(r.levelno for r in records),
+                "",
+                0,
+                "Flight recorder: the last %d records",
+                (len(records),),
+                None,
+            )
+            for record in [header] + records:
+                target.handle(record)
+            target.flush()
+        return len(records)
+
+
+class AsyncWriter(object):
+    """Formats and writes records for :class:`TqdmLoggingHandler` on a single
+    background thread.
+
+    Records are put into a bounded queue by the logging threads. The writer
+    thread takes them off in batches of up to `batch_size`, formats them with
+    the formatter of the handler that received them and writes each batch with
+    a single `tqdm.write` call. Records (including their %-style args and any
+    :class:`LazyMessage`) are therefore rendered on the writer thread.
+
+    What happens when the queue is full depends on `overflow`:
+
+    * ``"block"``: the logging thread waits for room.
+    * ``"drop_oldest"``: the oldest queued record is discarded.
+    * ``"drop_below"``: new records below `drop_level` are discarded, records
+      at or above it wait for room.
+
+    With `drop_on_loop`, a thread running an asyncio event loop never waits
+    for room: records it would wait for are discarded instead, so logging
+    cannot stall the loop. Otherwise it waits like any other thread.
+
+    Discarded records, and records that could not be written, are counted per
+    level in :attr:`dropped`. Coroutines can await :meth:`aflush` and
+    :meth:`aclose`.
+
+    :param maxsize: max number of queued records
+    :param overflow: overflow policy, one of ``"block"``, ``"drop_oldest"``,
+        ``"drop_below"``
+    :param drop_level: level below which records are dropped with the
+        ``"drop_below"`` policy
+    :param batch_size: max number of records written per `tqdm.write`
+    :param drop_on_loop: whether records that would wait for room are dropped
+        when logged from an event loop thread
+    """
+
+    BLOCK = "block"
+    DROP_OLDEST = "drop_oldest"
+    DROP_BELOW = "drop_below"
+    POLICIES = (BLOCK, DROP_OLDEST, DROP_BELOW)
+
+    def __init__(
+        self,
+        maxsize=10000,
+        overflow=BLOCK,
+        drop_level=logging.WARNING,
+        batch_size=512,
+        drop_on_loop=False,
+    ):
+        if overflow not in self.POLICIES:
+            raise ValueError(
+                "Overflow policy '{}' not recognized. Select from {}".format(
+                    overflow, self.POLICIES
+                )
+            )
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.drop_level = logging._checkLevel(drop_level)
+        self.batch_size = batch_size
+        self.drop_on_loop = drop_on_loop
+        self.dropped = {}
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._idle = threading.Condition(self._lock)
+        self._unfinished = 0
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._run, name="loggable-writer", daemon=True
+        )
+        self._thread.start()
+
+    @property
+    def dropped_total(self):
+        """Total number of dropped records."""
+        return sum(self.dropped.values())
+
+    def _drop(self, record):
+        self.dropped[record.levelno] = self.dropped.get(record.levelno, 0) + 1
+
+    def put(self, handler, record):
+        """Queue a record to be formatted and written by `handler`."""
+        with self._lock:
+            if self._closed:
+                raise ValueError("Cannot write to a closed AsyncWriter")
+            queue = self._queue
+            if len(queue) >= self.maxsize:
+                if self.overflow == self.DROP_OLDEST:
+                    self._drop(queue.popleft()[1])
+                    self._unfinished -= 1
+                elif (
+                    self.overflow == self.DROP_BELOW
+                    and record.levelno < self.drop_level
+                ):
+                    self._drop(record)
+                    return
+                elif self.drop_on_loop and in_event_loop():
+                    self._drop(record)
+                    return
+                else:
+                    while len(queue) >= self.maxsize and not self._closed:
+                        self._not_full.wait()
+                    if self._closed:
+                        self._drop(record)
+                        return
+            queue.append((handler, record))
+            self._unfinished += 1
+            self._not_empty.notify()
+
+    def _take(self):
+        with self._lock:
+            while not self._queue and not self._closed:
+                self._not_empty.wait()
+            queue = self._queue
+            n = min(len(queue), self.batch_size)
+            batch = [queue.popleft() for _ in range(n)]
+            self._not_full.notify_all()
+            return batch
+
+    def _write(self, batch):
+        # consecutive records sharing a tqdm class are joined into one write
+        lines = []
+        written = []  # (record, format time) of each line
+        tqdm_cls = None
+        last = None  # the handler of the last line
+        for handler, record in batch:
+            if handler._tqdm is not tqdm_cls and lines:
+                self._write_lines(last, tqdm_cls, lines, written)
+                lines = []
+                written = []
+            tqdm_cls = handler._tqdm
+            last = handler
+            try:
+                t1 = perf_counter_ns()
+                lines.append(handler.format(record))
+                written.append((record, perf_counter_ns() - t1))
+            except Exception:
+                handler.handleError(record)
+        if lines:
+            self._write_lines(last, tqdm_cls, lines, written)
+
+    def _write_lines(self, handler, tqdm_cls, lines, written):
+        t1 = perf_counter_ns()
+        try:
+            tqdm_cls.write("\n".join(lines))
+        except Exception:
+            # the lines are lost: count them and report the error once
+            with self._lock:
+                for record, _ in written:
+                    self._drop(record)
+            handler.handleError(written[-1][0])
+            return
+        _count_written(
+            TqdmLoggingHandler.log_metrics, written, lines, perf_counter_ns() - t1
+        )
+
+    def _run(self):
+        while True:
+            batch = self._take()
+            if not batch:
+                return
+            try:
+                self._write(batch)
+            except Exception:
+                with self._lock:
+                    for _, record in batch:
+                        self._drop(record)
+            finally:
+                with self._lock:
+                    self._unfinished -= len(batch)
+                    if self._unfinished <= 0:
+                        self._idle.notify_all()
+
+    def flush(self, timeout=None):
+        """Block until every queued record has been written.
+
+        :return: True if the queue was drained, False on timeout
+        """
+        if threading.current_thread() is self._thread:
+            return False
+        with self._lock:
+            return self._idle.wait_for(lambda: self._unfinished <= 0, timeout)
+
+    def close(self, timeout=None):
+        """Write the remaining records and stop the writer thread."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+        self._thread.join(timeout)
+
+    async def aflush(self, timeout=None):
+        """Wait for every queued record to be written, without blocking the
+        event loop.
+
+        :return: True if the queue was drained, False on timeout
+        """
+        return await _in_executor(self.flush, timeout)
+
+    async def aclose(self, timeout=None):
+        """Write the remaining records and stop the writer thread, without
+        blocking the event loop."""
+        await _in_executor(self.close, timeout)
+
+
+def _in_executor(function, *args):
+    import asyncio
+
+    try:
+        loop = asyncio.get_running_loop()
+    except AttributeError:  # python < 3.7
+        loop = asyncio.get_event_loop()
+    return loop.run_in_executor(None, function, *args)
+
+
+def enable_async(**kwargs):
+    """Switch every :class:`TqdmLoggingHandler` to asynchronous mode. Keyword
+    arguments are passed to :class:`AsyncWriter`. The writer is flushed and
+    closed at interpreter exit.
+
+    With the default ``"block"`` overflow policy, logging from a coroutine
+    blocks the event loop while the queue is full. Pass ``drop_on_loop=True``
+    to drop those records instead, or use a dropping policy.
+
+    :return: the new writer
+    """
+    disable_async()
+    writer = AsyncWriter(**kwargs)
+    TqdmLoggingHandler.writer = writer
+    return writer
+
+
+def disable_async():
+    """Flush and close the current :class:`AsyncWriter`, if any, and return
+    every :class:`TqdmLoggingHandler` to writing synchronously."""
+    writer = TqdmLoggingHandler.writer
+    TqdmLoggingHandler.writer = None
+    if writer is not None:
+        writer.close()
+    return writer
+
+
+async def adisable_async(timeout=None):
+    """Like :func:`disable_async`, but awaits the current writer without
+    blocking the event loop, e.g. on the shutdown of an asyncio program."""
+    writer = TqdmLoggingHandler.writer
+    TqdmLoggingHandler.writer = None
+    if writer is not None:
+        await writer.aclose(timeout)
+    return writer
+
+
+atexit.register(disable_async)
@@ -0,0 +1,153 @@
+"""Counters of what logging costs, per logger and level.
+
+:data:`log_metrics` counts the messages passed to :meth:`Loggable.log` that
+were emitted or suppressed (below the level, or by a sampling policy), and
+the records written by :class:`loggable.handlers.TqdmLoggingHandler`, with
+the characters written and the time spent formatting and writing them.
+
+Each thread increments counters of its own, without locks, and the counters
+of all threads are merged when they are read, so they can be left on in
+production. Disabled level methods (see :meth:`Loggable.set_level`) count
+suppressed messages on an ``itertools.count`` per logger and level instead,
+shared by all threads since `next()` on it is atomic:
+
+.. code-block:: python
+
+    log_metrics.snapshot()
+    # {"MyLogger": {"INFO": {"calls": 3, "emitted": 2, "suppressed": 1, ...}}}
+    log_metrics.reset()
+"""
+
+import logging
+import threading
+import weakref
+from itertools import count
+
+FIELDS = ("emitted", "suppressed", "written", "chars", "format_ns", "write_ns")
+EMITTED, SUPPRESSED, WRITTEN, CHARS, FORMAT_NS, WRITE_NS = range(len(FIELDS))
+
+
+class LogMetrics(object):
+    """Counters per (logger name, level), one set per thread."""
+
+    def __init__(self):
+        self.enabled = True
+        self._local = threading.local()
+        self._threads = []  # (weakref to thread, counters) of each thread
+        self._retired = {}  # counters of threads that have exited
+        self._baseline = {}
+        self._suppressed = {}  # (name, level) to a count of suppressed messages
+        self._lock = threading.Lock()
+
+    def _row(self, name, level):
+        try:
+            counters = self._local.counters
+        except AttributeError:
+            counters = self._local.counters = {}
+            with self._lock:
+                self._threads.append(
+                    (weakref.ref(threading.current_thread()), counters)
+                )
+        row = counters.get((name, level))
+        if row is None:
+            row = counters[(name, level)] = [0] * len(FIELDS)
+        return row
+
+    def count(self, name, level, field, n=1):
+        """Add `n` to a counter (one of the indices of `FIELDS`)."""
+        try:
+            row = self._local.counters[(name, level)]
+        except (AttributeError, KeyError):
+            row = self._row(name, level)
+        row[field] += n
+
+    def suppressed_counter(self, name, level):
+        """Return the shared counter of suppressed messages of a logger and
+        level, for callers that count with ``next(counter)``."""
+        counter = self._suppressed.get((name, level))
+        if counter is None:
+            with self._lock:
+                counter = self._suppressed.setdefault((name, level), count())
+        return counter
+
+    def count_written(self, name, level, chars, format_ns, write_ns):
+        """Count a record written by a handler."""
+        try:
+            row = self._local.counters[(name, level)]
+        except (AttributeError, KeyError):
+            row = self._row(name, level)
+        row[WRITTEN] += 1
+        row[CHARS] += chars
+        row[FORMAT_NS] += format_ns
+        row[WRITE_NS] += write_ns
+
+    def _merged(self):
+        totals = {}
+        with self._lock:
+            threads = []
+            for thread, counters in self._threads:
+                thread = thread()
+                if thread is None or not thread.is_alive():
+                    _add(self._retired, counters)
+                else:
+                    threads.append((weakref.ref(thread), counters))
+            self._threads = threads
+            _add(totals, self._retired)
+            for _, counters in threads:
+                _add(totals, counters)
+            for key, counter in self._suppressed.items():
+                n = _value(counter)
+                if n:
+                    row = totals.get(key)
+                    if row is None:
+                        row = totals[key] = [0] * len(FIELDS)
+                    row[SUPPRESSED] += n
+        return totals
+
+    def snapshot(self, name=None):
+        """Return the counters since the last reset, as
+        ``{logger name: {level name: {counter: value}}}``. `calls` is the sum
+        of `emitted` and `suppressed`.
+
+        :param name: only return the counters of this logger, as
+            ``{level name: {counter: value}}``
+        """
+        baseline = self._baseline
+        snapshot = {}
+        for (logger, level), row in sorted(self._merged().items()):
+            if name is not None and logger != name:
+                continue
+            base = baseline.get((logger, level))
+            if base is not None:
+                row = [x - b for x, b in zip(row, base)]
+            if not any(row):
+                continue
+            d = dict(zip(FIELDS, row))
+            d["calls"] = d["emitted"] + d["suppressed"]
+            snapshot.setdefault(logger, {})[logging.getLevelName(level)] = d
+        if name is not None:
+            return snapshot.get(name, {})
+        return snapshot
+
+    def reset(self):
+        """Start counting from zero again."""
+        self._baseline = self._merged()
+
+
+def _value(counter):
+    """The next value of an ``itertools.count``, without advancing it."""
+    return int(repr(counter)[len("count(") : -1])
+
+
+def _add(totals, counters):
+    for key, row in list(counters.items()):
+        total = totals.get(key)
+        if total is None:
+            totals[key] = list(row)
+        else:
+            for i, x in enumerate(row):
+                total[i] += x
+
+
+# default counters of every Loggable and handler
+log_metrics = LogMetrics()
@@ -0,0 +1,326 @@
+"""Merge the logs and progress bars of worker processes into the parent.
+
+Workers forward their records and progress bar updates, in batches, over a
+multiprocessing queue to a :class:`LogCollector` running in the parent, which
+writes a single merged stream and one aggregated progress bar per description.
+
+.. code-block:: python
+
+    from multiprocessing import Pool
+    from loggable.multiprocess import LogCollector
+
+    logger = Loggable("Parent").set_level("INFO")
+
+    def work(args):
+        logger, x = args
+        logger.info("working on {}".format(x))
+
+    with LogCollector() as collector:
+        with Pool(4, *collector.initializer()) as pool:
+            pool.map(work, [(logger, x) for x in range(100)])
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from itertools import count
+from multiprocessing.util import Finalize
+
+from loggable import Loggable
+from loggable.formatters import new_formatter
+from loggable.handlers import TqdmLoggingHandler, tqdm_class
+from loggable.stacks import render_stack
+
+_RECORD = "record"
+_WRITE = "write"
+_OPEN = "open"
+_UPDATE = "update"
+_CLOSE = "close"
+
+_bar_ids = count()
+
+
+class RemoteTqdm(object):
+    """Progress bar used in worker processes. Increments are accumulated locally
+    and sent to the parent's :class:`LogCollector` with the next batch.
+
+    Implements the parts of the `tqdm` interface used by
+    :class:`loggable.Loggable`.
+    """
+
+    forwarder = None
+
+    def __init__(self, iterable=None, desc=None, total=None, **kwargs):
+        if total is None and iterable is not None:
+            try:
+                total = len(iterable)
+            except (TypeError, AttributeError):
+                pass
+        self.iterable = iterable
+        self.desc = desc or ""
+        self.total = total
+        self.n = 0
+        self.key = "{}:{}".format(os.getpid(), next(_bar_ids))
+        self._pending = 0
+        # increments come from the worker thread and are taken by the
+        # forwarder thread
+        self._pending_lock = threading.Lock()
+        self._opened = False
+        self._closed = False
+
+    def __iter__(self):
+        for x in self.iterable:
+            yield x
+            self.update(1)
+        self.close()
+
+    def __len__(self):
+        return self.total
+
+    def set_description(self, desc=None, refresh=True):
+        self.desc = desc or ""
+
+    def update(self, n=1):
+        self.n += n
+        with self._pending_lock:
+            self._pending += n
+        self.forwarder.dirty(self)
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self.forwarder.close_bar(self)
+
+    @classmethod
+    def write(cls, s, file=None, end="\n", nolock=False):
+        cls.forwarder.send((_WRITE, s))
+
+
+class Forwarder(object):
+    """Writer installed on :class:`TqdmLoggingHandler` in worker processes.
+
+    Records are prepared (their message rendered and exception formatted) and
+    buffered; the buffer is sent to the parent once it holds `batch_size`
+    items, or at the latest `interval` seconds after the oldest buffered item.
+    """
+
+    progress_cls = RemoteTqdm
+
+    def __init__(self, queue, batch_size=256, interval=0.1):
+        self.queue = queue
+        self.batch_size = batch_size
+        self.interval = interval
+        self._buffer = []
+        self._dirty = {}
+        self._lock = threading.RLock()
+        self._last_send = time.monotonic()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="loggable-forwarder", daemon=True
+        )
+        self._thread.start()
+
+    def _run(self):
+        while not self._closed.wait(self.interval):
+            self.flush()
+
+    @staticmethod
+    def _prepare(handler, record):
+        render_stack(record)
+        d = dict(record.__dict__)
+        d["msg"] = record.getMessage()
+        d["args"] = None
+        if record.exc_info:
+            d["exc_text"] = (handler.formatter or logging.Formatter()).formatException(
+                record.exc_info
+            )
+        d["exc_info"] = None
+        d.pop("message", None)
+        return d
+
+    def put(self, handler, record):
+        self.send((_RECORD, self._prepare(handler, record)))
+
+    def send(self, item):
+        with self._lock:
+            self._buffer.append(item)
+            if (
+                len(self._buffer) >= self.batch_size
+                or time.monotonic() - self._last_send >= self.interval
+            ):
+                self.flush()
+
+    def dirty(self, bar):
+        """Mark a bar as having increments to send."""
+        if bar.key not in self._dirty:
+            with self._lock:
+                self._dirty[bar.key] = bar
+
+    def close_bar(self, bar):
+        with self._lock:
+            self.flush_bar(bar)
+            self._dirty.pop(bar.key, None)
+            self._buffer.append((_CLOSE, bar.key))
+        self.flush()
+
+    def flush_bar(self, bar):
+        if not bar._opened:
+            bar._opened = True
+            self._buffer.append((_OPEN, bar.key, bar.desc, bar.total))
+        with bar._pending_lock:
+            pending = bar._pending
+            bar._pending = 0
+        if pending:
+            self._buffer.append((_UPDATE, bar.key, pending))
+
+    def flush(self):
+        """Send the buffered records and progress increments."""
+        with self._lock:
+            dirty = self._dirty
+            self._dirty = {}
+            for bar in dirty.values():
+                self.flush_bar(bar)
+            buffer = self._buffer
+            self._buffer = []
+            self._last_send = time.monotonic()
+        if buffer:
+            self.queue.put(buffer)
+
+    def close(self):
+        self._closed.set()
+        self.flush()
+
+
+def init_worker(queue, batch_size=256, interval=0.1):
+    """Forward the logs and progress bars of this process to `queue`. Use as
+    the initializer of a `multiprocessing.Pool` or `ProcessPoolExecutor`."""
+    forwarder = Forwarder(queue, batch_size=batch_size, interval=interval)
+    TqdmLoggingHandler.writer = forwarder
+    RemoteTqdm.forwarder = forwarder
+    Finalize(forwarder, forwarder.close, exitpriority=100)
+    return forwarder
+
+
+class LogCollector(object):
+    """Collects records and progress bar updates forwarded by worker processes
+    and renders them as a single stream in this process.
+
+    Progress bars of all workers sharing a description are aggregated into
+    one bar whose total is the sum of their totals.
+
+    :param format: the log format. Default is found at Loggable.DEFAULT_FORMAT
+    :param log_colors: the log colors. Default is found at
+        Loggable.DEFAULT_COLORS
+    :param tqdm: the tqdm class used for the merged output. Default is
+        tqdm.tqdm.
+    :param output: the output mode, see :class:`loggable.Loggable`
+    :param batch_size: max number of items workers buffer before sending
+    :param interval: max number of seconds workers buffer items for
+    :param context: the multiprocessing context to create the queue with
+    """
+
+    def __init__(
+        self,
+        format=None,
+        log_colors=None,
+        tqdm=None,
+        output=None,
+        batch_size=256,
+        interval=0.1,
+        context=None,
+    ):
+        self.batch_size = batch_size
+        self.interval = interval
+        self.queue = (context or multiprocessing).Queue()
+        self._tqdm = tqdm
+        self.handler = TqdmLoggingHandler(tqdm=tqdm)
+        self.handler.setFormatter(
+            new_formatter(
+                output,
+                format or Loggable.DEFAULT_FORMAT,
+                log_colors or Loggable.DEFAULT_COLORS,
+            )
+        )
+        self.bars = {}  # desc to [tqdm, set of worker bar keys]
+        self._bar_descs = {}  # worker bar key to desc
+        self.errors = 0  # number of items that could not be handled
+        self._thread = None
+
+    def initializer(self):
+        """Return the `(initializer, initargs)` for a worker pool."""
+        return init_worker, (self.queue, self.batch_size, self.interval)
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._run, name="loggable-collector", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Render everything sent so far and stop collecting."""
+        if self._thread is not None:
+            self.queue.put(None)
+            self._thread.join()
+            self._thread = None
+        for bar, _ in self.bars.values():
+            bar.close()
+        self.bars = {}
+        self._bar_descs = {}
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def _run(self):
+        while True:
+            batch = self.queue.get()
+            if batch is None:
+                return
+            for item in batch:
+                try:
+                    self._handle(item)
+                except Exception:
+                    self.errors += 1
+                    self.handler.handleError(
+                        logging.makeLogRecord(
+                            {"msg": "Malformed item from a worker: %r", "args": (item,)}
+                        )
+                    )
+
+    def _handle(self, item):
+        kind = item[0]
+        if kind == _RECORD:
+            self.handler.handle(logging.makeLogRecord(item[1]))
+        elif kind == _UPDATE:
+            desc = self._bar_descs.get(item[1])
+            if desc in self.bars:
+                self.bars[desc][0].update(item[2])
+        elif kind == _OPEN:
+            _, key, desc, total = item
+            self._bar_descs[key] = desc
+            if desc in self.bars:
+                bar, keys = self.bars[desc]
+                if bar.total is not None and total is not None:
+                    bar.total += total
+                    bar.refresh()
+                keys.add(key)
+            else:
+                self.bars[desc] = [
+                    tqdm_class(self._tqdm)(total=total, desc=desc),
+                    {key},
+                ]
+        elif kind == _CLOSE:
+            desc = self._bar_descs.pop(item[1], None)
+            if desc in self.bars:
+                bar, keys = self.bars[desc]
+                keys.discard(item[1])
+                if not keys:
+                    bar.close()
+                    del self.bars[desc]
+        elif kind == _WRITE:
+            self.handler._tqdm.write(item[1])
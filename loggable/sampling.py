@@ -0,0 +1,223 @@
+"""Per-call-site rate limiting and sampling for :class:`loggable.Loggable`.
+
+A policy decides, for each call site (the line that called the logger),
+which messages are emitted. Suppressed messages are counted, and once the
+policy's `period` has elapsed a summary record reports how many were
+suppressed: it precedes the next message from that call site, or is logged
+from a timer if the call site stays silent.
+
+.. code-block:: python
+
+    logger.set_sampling(RateLimit(10))  # at most 10 per second per call site
+    logger.set_sampling(Sample(100))  # 1 in 100
+    logger.set_sampling(FirstThenEvery(10, 1000))
+"""
+
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+
+
+class SamplingPolicy(ABC):
+    """Base class for call site policies.
+
+    :param period: seconds between summaries of suppressed messages
+    """
+
+    def __init__(self, period=1.0):
+        self.period = period
+
+    @abstractmethod
+    def allow(self, site):
+        """Whether to emit the current message of the :class:`CallSite`."""
+
+    def __repr__(self):
+        return "<{}>".format(self.__class__.__name__)
+
+
+class RateLimit(SamplingPolicy):
+    """Emit at most `n` messages per `period` seconds."""
+
+    def __init__(self, n, period=1.0):
+        super().__init__(period)
+        self.n = n
+
+    def allow(self, site):
+        return site.window_calls <= self.n
+
+    def __repr__(self):
+        return "<{} {} per {}s>".format(self.__class__.__name__, self.n, self.period)
+
+
+class Sample(SamplingPolicy):
+    """Emit 1 in `k` messages, starting with the first."""
+
+    def __init__(self, k, period=1.0):
+        super().__init__(period)
+        self.k = k
+
+    def allow(self, site):
+        return (site.calls - 1) % self.k == 0
+
+    def __repr__(self):
+        return "<{} 1 in {}>".format(self.__class__.__name__, self.k)
+
+
+class FirstThenEvery(SamplingPolicy):
+    """Emit the first `first` messages, then every `every`-th one."""
+
+    def __init__(self, first, every, period=1.0):
+        super().__init__(period)
+        self.first = first
+        self.every = every
+
+    def allow(self, site):
+        calls = site.calls
+        return calls <= self.first or (calls - self.first) % self.every == 0
+
+    def __repr__(self):
+        return "<{} first {} then every {}>".format(
+            self.__class__.__name__, self.first, self.every
+        )
+
+
+class CallSite(object):
+    """Counts of the messages from a single call site."""
+
+    __slots__ = (
+        "filename",
+        "lineno",
+        "calls",
+        "window_start",
+        "window_calls",
+        "suppressed",
+        "level",
+    )
+
+    def __init__(self, filename, lineno, now):
+        self.filename = filename
+        self.lineno = lineno
+        self.calls = 0
+        self.window_start = now
+        self.window_calls = 0
+        self.suppressed = 0
+        self.level = None
+
+
+class CallSiteSampler(object):
+    """Applies a :class:`SamplingPolicy` to each call site of a Loggable.
+
+    Call sites are keyed by the code object and line number of the first frame
+    outside of `skip_files`, so no frame is ever formatted.
+
+    :param report: called with the (level, message) of the summaries of
+        periods that end without a further message from their call site
+    """
+
+    def __init__(self, policy, skip_files=(), report=None):
+        self.policy = policy
+        self.skip_files = frozenset(skip_files)
+        self.report = report
+        self.sites = {}
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def _call_site_key(self):
+        frame = sys._getframe(2)
+        skip_files = self.skip_files
+        while frame.f_back is not None and frame.f_code.co_filename in skip_files:
+            frame = frame.f_back
+        return frame.f_code, frame.f_lineno
+
+    def check(self, level):
+        """Count a message from the calling site.
+
+        :return: tuple of whether the message is allowed, and a summary of
+            the messages suppressed in the previous period (or None)
+        """
+        key = self._call_site_key()
+        now = time.monotonic()
+        summary = None
+        with self._lock:
+            site = self.sites.get(key)
+            if site is None:
+                site = CallSite(key[0].co_filename, key[1], now)
+                self.sites[key] = site
+            if now - site.window_start >= self.policy.period:
+                if site.suppressed:
+                    summary = self._summary(site)
+                site.window_start = now
+                site.window_calls = 0
+                site.suppressed = 0
+            site.calls += 1
+            site.window_calls += 1
+            allowed = self.policy.allow(site)
+            if not allowed:
+                site.suppressed += 1
+                site.level = level
+                if self._timer is None and self.report is not None:
+                    self._start_timer(site.window_start + self.policy.period - now)
+        return allowed, summary
+
+    def _start_timer(self, delay):
+        self._timer = threading.Timer(max(delay, 0), self._expire)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _expire(self):
+        """Report the call sites whose period ended with suppressed messages,
+        and wait for the next period to end."""
+        now = time.monotonic()
+        summaries = []
+        with self._lock:
+            self._timer = None
+            next_end = None
+            for site in self.sites.values():
+                if site.suppressed:
+                    end = site.window_start + self.policy.period
+                    if end <= now:
+                        summaries.append(self._end_period(site, now))
+                    elif next_end is None or end < next_end:
+                        next_end = end
+            if next_end is not None:
+                self._start_timer(next_end - now)
+        for level, msg in summaries:
+            self.report(level, msg)
+
+    def _summary(self, site):
+        msg = "Suppressed {} messages from {}:{} ({!r})".format(
+            site.suppressed, site.filename, site.lineno, self.policy
+        )
+        return site.level, msg
+
+    def flush(self):
+        """Return the summaries of every call site with suppressed messages
+        and start new periods for them.
+
+        :return: list of (level, message) tuples
+        """
+        now = time.monotonic()
+        summaries = []
+        with self._lock:
+            for site in self.sites.values():
+                if site.suppressed:
+                    summaries.append(self._end_period(site, now))
+        return summaries
+
+    def _end_period(self, site, now):
+        summary = self._summary(site)
+        site.window_start = now
+        site.window_calls = 0
+        site.suppressed = 0
+        return summary
+
+    def __getstate__(self):
+        return {
+            "policy": self.policy,
+            "skip_files": self.skip_files,
+            "report": self.report,
+        }
+
+    def __setstate__(self, d):
+        self.__init__(d["policy"], d["skip_files"], d.get("report"))
@@ -0,0 +1,81 @@
+"""Cheap stack capture for records logged with a `tb_limit`.
+
+Capturing only walks frames with ``sys._getframe`` and keeps their code
+objects and line numbers on the record, as ``record.stack_frames``. The stack
+is rendered into ``record.stack_info`` when the record is formatted by a
+:class:`loggable.handlers.LoggableHandler`, so it is written through the
+handler and formatter like the rest of the record. Rendered stacks are cached
+per call site.
+"""
+
+import linecache
+import sys
+import threading
+import traceback
+
+STACK_FRAMES = "stack_frames"
+
+
+def capture(limit, skip_files=(), depth=0):
+    """Return the `limit` innermost frames of the caller as (code, lineno)
+    tuples, innermost first.
+
+    :param skip_files: files whose innermost frames are skipped, e.g. the
+        logging library
+    :param depth: the number of innermost frames of the caller to skip
+    """
+    frame = sys._getframe(depth + 1)
+    while frame is not None and frame.f_code.co_filename in skip_files:
+        frame = frame.f_back
+    frames = []
+    while frame is not None and len(frames) < limit:
+        frames.append((frame.f_code, frame.f_lineno))
+        frame = frame.f_back
+    return tuple(frames)
+
+
+class StackCache(object):
+    """Rendered stacks per tuple of frames. Once `maxsize` stacks are cached
+    the cache is cleared."""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._stacks = {}
+        self._lock = threading.Lock()
+
+    def render(self, frames):
+        text = self._stacks.get(frames)
+        if text is None:
+            text = self._format(frames)
+            with self._lock:
+                if len(self._stacks) >= self.maxsize:
+                    self._stacks.clear()
+                self._stacks[frames] = text
+        return text
+
+    @staticmethod
+    def _format(frames):
+        summary = traceback.StackSummary.from_list(
+            [
+                (
+                    code.co_filename,
+                    lineno,
+                    code.co_name,
+                    linecache.getline(code.co_filename, lineno).strip(),
+                )
+                for code, lineno in reversed(frames)
+            ]
+        )
+        return "Stack (most recent call last):\n" + "".join(summary.format()).rstrip(
+            "\n"
+        )
+
+
+stacks = StackCache()
+
+
+def render_stack(record):
+    """Render the frames captured for a record into its `stack_info`."""
+    frames = record.__dict__.pop(STACK_FRAMES, None)
+    if frames and not record.stack_info:
+        record.stack_info = stacks.render(frames)
@@ -0,0 +1,136 @@
+"""Compact summaries of NumPy arrays and pandas objects for
+:func:`loggable.condense_long_lists`.
+
+NumPy and pandas are optional: they are never imported here, an object is
+only summarized if its library has already been imported by the caller.
+Summaries report the shape, dtype and memory size along with a few head and
+tail values and, for numeric data, vectorized min/max/mean. The full repr of
+the object is never built.
+"""
+
+import sys
+import warnings
+
+
+class Summary(object):
+    """Text standing in for a summarized object. Its repr is the text, so it
+    is printed without quotes."""
+
+    __slots__ = ("text",)
+
+    def __init__(self, text):
+        self.text = text
+
+    def __repr__(self):
+        return self.text
+
+    __str__ = __repr__
+
+
+def _format_bytes(n):
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if n < 1024 or unit == "GiB":
+            break
+        n /= 1024.0
+    if unit == "B":
+        return "{} B".format(int(n))
+    return "{:.1f} {}".format(n, unit)
+
+
+def _format_values(values):
+    return ", ".join(repr(v) for v in values)
+
+
+def _stats(np, a):
+    """Vectorized min/max/mean of a numeric array, ignoring NaNs."""
+    if a.size == 0 or a.dtype.kind not in "biuf":
+        return None
+    with warnings.catch_warnings(), np.errstate(all="ignore"):
+        warnings.simplefilter("ignore", RuntimeWarning)
+        if a.dtype.kind == "f":
+            lo, hi, mean = np.nanmin(a), np.nanmax(a), np.nanmean(a)
+        else:
+            lo, hi, mean = a.min(), a.max(), a.mean(dtype="float64")
+    return "min={!r}, max={!r}, mean={:.6g}".format(lo.item(), hi.item(), mean)
+
+
+def _with_stats(np, text, a):
+    stats = _stats(np, a)
+    return "{}, {}".format(text, stats) if stats else text
+
+
+def _head_tail_flat(a, n):
+    if not a.size:
+        return "[]"
+    flat = a.reshape(-1) if a.flags.c_contiguous else a.flat
+    size = a.size
+    if size <= n:
+        return "[{}]".format(_format_values(flat[:size].tolist()))
+    head = n // 2
+    tail = n - head
+    return "[{}, ..., {}]".format(
+        _format_values(flat[:head].tolist()),
+        _format_values(flat[size - tail : size].tolist()),
+    )
+
+
+def summarize_ndarray(np, a, n):
+    if a.ndim == 0:
+        return Summary(repr(a.item()))
+    text = "ndarray(shape={}, dtype={}, size={}, values={}".format(
+        a.shape, a.dtype, _format_bytes(a.nbytes), _head_tail_flat(a, n)
+    )
+    return Summary(_with_stats(np, text, a) + ")")
+
+
+def summarize_series(np, s, n):
+    a = s.to_numpy()
+    text = "Series(name={!r}, length={}, dtype={}, size={}, values={}".format(
+        s.name,
+        len(s),
+        s.dtype,
+        _format_bytes(s.memory_usage(index=False, deep=False)),
+        _head_tail_flat(a, n),
+    )
+    return Summary(_with_stats(np, text, a) + ")")
+
+
+def summarize_dataframe(np, df, n):
+    shown = df.iloc[:, :n]
+    columns = []
+    for i, name in enumerate(shown.columns):
+        column = "{!r}: {}".format(name, shown.dtypes.iloc[i])
+        stats = _stats(np, shown.iloc[:, i].to_numpy())
+        columns.append("{} ({})".format(column, stats) if stats else column)
+    if df.shape[1] > n:
+        columns.append("...({} more)".format(df.shape[1] - n))
+    return Summary(
+        "DataFrame(shape={}, size={}, columns={{{}}})".format(
+            df.shape,
+            _format_bytes(df.memory_usage(index=True, deep=False).sum()),
+            ", ".join(columns),
+        )
+    )
+
+
+def summarize(obj, n=20):
+    """Summarize a NumPy or pandas object.
+
+    :param obj: the object to summarize
+    :param n: max number of values to show
+    :return: a :class:`Summary`, or None if the object is not supported
+    """
+    np = sys.modules.get("numpy")
+    if np is None:
+        return None
+    if isinstance(obj, np.ndarray):
+        return summarize_ndarray(np, obj, n)
+    if isinstance(obj, np.generic):
+        return Summary(repr(obj.item()))
+    pd = sys.modules.get("pandas")
+    if pd is not None:
+        if isinstance(obj, pd.Series):
+            return summarize_series(np, obj, n)
+        if isinstance(obj, pd.DataFrame):
+            return summarize_dataframe(np, obj, n)
+    return None
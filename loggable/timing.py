@@ -0,0 +1,377 @@
+"""Aggregated timing statistics for :meth:`loggable.Loggable.timeit` blocks.
+
+Every timed block that exits is recorded under its prefix in
+:data:`timings`, whether or not its "Finished in" line is emitted, so hot
+sections can be profiled without printing one line per call. Durations are
+measured with the monotonic ``time.perf_counter_ns`` and percentiles come from
+a :class:`Histogram` of fixed relative precision.
+
+.. code-block:: python
+
+    for x in data:
+        with logger.timeit("DEBUG", prefix="load"):
+            load(x)
+    logger.log_timings("INFO")
+    # or print the table at exit
+    timings.dump_at_exit()
+
+Timed blocks entered while another is open on the same thread (or asyncio
+task) are also recorded as a call tree in :data:`tracer`, which can be
+exported as Chrome trace events (open in ``chrome://tracing`` or Perfetto) or
+as collapsed stacks for ``flamegraph.pl``.
+
+.. code-block:: python
+
+    tracer.write_chrome_trace("trace.json")
+    tracer.write_collapsed("stacks.txt")
+"""
+
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+from loggable.aio import current_task
+
+try:
+    import contextvars
+except ImportError:  # python < 3.7
+    contextvars = None
+
+try:
+    perf_counter_ns = time.perf_counter_ns
+except AttributeError:  # python < 3.7
+
+    def perf_counter_ns():
+        return int(time.perf_counter() * 1e9)
+
+
+def format_ns(ns):
+    """Format a duration in nanoseconds with a readable unit."""
+    for unit, scale in (("s", 1e9), ("ms", 1e6), ("us", 1e3)):
+        if ns >= scale:
+            return "{:.3g}{}".format(ns / scale, unit)
+    return "{}ns".format(int(ns))
+
+
+class Histogram(object):
+    """Streaming histogram of non-negative integers.
+
+    Values are counted in buckets whose width is at most 1/2**(`bits` - 1) of
+    their value (1.6% for the default), found from the bit length of the
+    value, so recording a value is a few integer operations and the number of
+    buckets only grows with the number of octaves spanned.
+    """
+
+    __slots__ = ("bits", "counts", "n")
+
+    def __init__(self, bits=7):
+        self.bits = bits
+        self.counts = {}  # bucket lower bound to count
+        self.n = 0
+
+    def add(self, value):
+        shift = value.bit_length() - self.bits
+        if shift > 0:
+            value = value >> shift << shift
+        counts = self.counts
+        counts[value] = counts.get(value, 0) + 1
+        self.n += 1
+
+    def _midpoint(self, bucket):
+        shift = bucket.bit_length() - self.bits
+        if shift > 0:
+            return bucket + (1 << shift) // 2
+        return bucket
+
+    def quantiles(self, qs):
+        """Estimate quantiles.
+
+        :param qs: quantiles between 0 and 1, in increasing order
+        :return: list of the estimates, or Nones if the histogram is empty
+        """
+        if not self.n:
+            return [None] * len(qs)
+        results = []
+        buckets = sorted(self.counts.items())
+        i = 0
+        seen = buckets[0][1]
+        for q in qs:
+            rank = q * self.n
+            while seen < rank and i < len(buckets) - 1:
+                i += 1
+                seen += buckets[i][1]
+            results.append(self._midpoint(buckets[i][0]))
+        return results
+
+
+class TimingStats(object):
+    """Count, total, min, max and distribution of the durations of a block,
+    in nanoseconds."""
+
+    __slots__ = ("count", "total", "min", "max", "histogram")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+        self.histogram = Histogram()
+
+    def add(self, ns):
+        self.count += 1
+        self.total += ns
+        if self.min is None or ns < self.min:
+            self.min = ns
+        if self.max is None or ns > self.max:
+            self.max = ns
+        self.histogram.add(ns)
+
+    def as_dict(self):
+        p50, p95, p99 = self.histogram.quantiles((0.5, 0.95, 0.99))
+        return dict(
+            count=self.count,
+            total=self.total,
+            mean=self.total / self.count if self.count else None,
+            min=self.min,
+            max=self.max,
+            p50=p50,
+            p95=p95,
+            p99=p99,
+        )
+
+
+class TimingAggregator(object):
+    """Collects :class:`TimingStats` per key (the prefix of timed blocks)."""
+
+    COLUMNS = ("count", "total", "mean", "min", "p50", "p95", "p99", "max")
+
+    def __init__(self):
+        self.stats = {}
+        self._lock = threading.Lock()
+        self._dump_at_exit = False
+
+    def record(self, key, ns):
+        """Record a duration, in nanoseconds, under `key`."""
+        with self._lock:
+            stats = self.stats.get(key)
+            if stats is None:
+                stats = self.stats[key] = TimingStats()
+            stats.add(ns)
+
+    def snapshot(self):
+        """Return the statistics of each key as dicts, in nanoseconds."""
+        with self._lock:
+            return {key: stats.as_dict() for key, stats in self.stats.items()}
+
+    def reset(self):
+        with self._lock:
+            self.stats = {}
+
+    def summary(self):
+        """Return the statistics as a table, slowest total first."""
+        snapshot = self.snapshot()
+        rows = [("prefix",) + self.COLUMNS]
+        for key, d in sorted(snapshot.items(), key=lambda kv: -kv[1]["total"]):
+            rows.append(
+                (str(key) or '""', str(d["count"]))
+                + tuple(format_ns(d[c]) for c in self.COLUMNS[1:])
+            )
+        widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+        return "\n".join(
+            "  ".join(
+                cell.ljust(w) if i == 0 else cell.rjust(w)
+                for i, (cell, w) in enumerate(zip(row, widths))
+            )
+            for row in rows
+        )
+
+    def dump(self, file=None):
+        """Write the summary table to `file` (default is sys.stderr)."""
+        if self.stats:
+            print(self.summary(), file=file or sys.stderr)
+
+    def dump_at_exit(self, file=None):
+        """Write the summary table when the interpreter exits."""
+        if not self._dump_at_exit:
+            self._dump_at_exit = True
+            atexit.register(self.dump, file)
+
+
+class SpanNode(object):
+    """A node of the call tree of timed blocks. Its total time includes the
+    time of its children; its self time does not."""
+
+    __slots__ = ("name", "parent", "children", "count", "total")
+
+    def __init__(self, name, parent=None):
+        self.name = name
+        self.parent = parent
+        self.children = {}
+        self.count = 0
+        self.total = 0
+
+    @property
+    def self_ns(self):
+        return max(self.total - sum(c.total for c in self.children.values()), 0)
+
+    def path(self):
+        """The names from the root (excluded) to this node."""
+        names = []
+        node = self
+        while node.parent is not None:
+            names.append(node.name)
+            node = node.parent
+        return names[::-1]
+
+    def walk(self):
+        """Yield this node and its descendants, depth first."""
+        yield self
+        for child in list(self.children.values()):
+            yield from child.walk()
+
+    def as_dict(self):
+        return dict(
+            name=self.name,
+            count=self.count,
+            total=self.total,
+            self=self.self_ns,
+            children=[c.as_dict() for c in self.children.values()],
+        )
+
+
+class _ThreadLocalSpan(object):
+    """The current span of each thread, where contextvars is unavailable."""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def get(self):
+        return getattr(self._local, "node", None)
+
+    def set(self, node):
+        self._local.node = node
+
+
+class Tracer(object):
+    """Records nested timed blocks as a call tree and as a bounded list of
+    trace events.
+
+    The current block is tracked per thread and per asyncio task (with
+    contextvars, on python >= 3.7), and events are attributed to the task
+    they ran in. Starting a block costs a dict lookup, and
+    finishing it a lock and an append.
+
+    :param max_events: number of most recent events kept for Chrome traces
+    :param max_nodes: max number of call tree nodes. Blocks at new paths
+        beyond it are counted under a "..." node of their parent.
+    """
+
+    def __init__(self, max_events=10000, max_nodes=10000):
+        self.enabled = True
+        self.max_nodes = max_nodes
+        self.root = SpanNode("")
+        self.events = deque(maxlen=max_events)
+        self._nodes = 1
+        self._lock = threading.Lock()
+        if contextvars is not None:
+            self._current = contextvars.ContextVar("loggable_span", default=None)
+        else:
+            self._current = _ThreadLocalSpan()
+
+    def start(self, name):
+        """Enter a block nested in the current one.
+
+        :return: the node of the block, to pass to `finish`
+        """
+        current = self._current
+        parent = current.get() or self.root
+        node = parent.children.get(name)
+        if node is None:
+            node = self._new_node(parent, name)
+        current.set(node)
+        return node
+
+    def _new_node(self, parent, name):
+        with self._lock:
+            node = parent.children.get(name)
+            if node is None:
+                if self._nodes >= self.max_nodes:
+                    name = "..."
+                    node = parent.children.get(name)
+                if node is None:
+                    node = parent.children[name] = SpanNode(name, parent)
+                    self._nodes += 1
+        return node
+
+    def finish(self, node, start_ns, end_ns):
+        """Exit the block of `node`, which ran from `start_ns` to `end_ns`
+        (values of `perf_counter_ns`)."""
+        parent = node.parent
+        # the root is the only node without a parent
+        self._current.set(parent if parent.parent is not None else None)
+        # blocks of concurrent tasks interleave, so each task gets its own
+        # track in Chrome traces
+        task = current_task()
+        tid = threading.get_ident() if task is None else id(task)
+        with self._lock:
+            node.count += 1
+            node.total += end_ns - start_ns
+            self.events.append((node.name, tid, start_ns, end_ns - start_ns))
+
+    def reset(self):
+        with self._lock:
+            self.root = SpanNode("")
+            self.events.clear()
+            self._nodes = 1
+
+    def chrome_trace(self):
+        """Return the recorded events in the Chrome Trace Event format."""
+        pid = os.getpid()
+        with self._lock:
+            events = list(self.events)
+        return {
+            "traceEvents": [
+                {
+                    "name": name,
+                    "ph": "X",
+                    "ts": start / 1000.0,
+                    "dur": duration / 1000.0,
+                    "pid": pid,
+                    "tid": tid,
+                }
+                for name, tid, start, duration in events
+            ],
+            "displayTimeUnit": "ms",
+        }
+
+    def write_chrome_trace(self, path):
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+
+    def collapsed(self):
+        """Return the call tree as collapsed stacks: one line per path with
+        its self time in microseconds, the input of ``flamegraph.pl``."""
+        lines = []
+        for node in self.root.walk():
+            if node is self.root:
+                continue
+            self_us = node.self_ns // 1000
+            if self_us:
+                names = (n.replace(";", ":") for n in node.path())
+                lines.append("{} {}".format(";".join(names), self_us))
+        return "\n".join(lines)
+
+    def write_collapsed(self, path):
+        with open(path, "w") as f:
+            f.write(self.collapsed() + "\n")
+
+
+# default aggregator of timed blocks
+timings = TimingAggregator()
+
+# default call tree of timed blocks
+tracer = Tracer()
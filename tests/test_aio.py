@@ -0,0 +1,197 @@
+import asyncio
+import threading
+
+from loggable import (
+    AsyncProgress,
+    Loggable,
+    ProgressLoggable,
+    TimedLoggable,
+    TqdmLoggingHandler,
+    adisable_async,
+    disable_async,
+    enable_async,
+)
+from loggable.aio import current_task, in_event_loop
+from loggable.timing import Tracer
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+class CountingBar(object):
+    """Stand-in for a tqdm progress bar."""
+
+    def __init__(self, iterable=None, total=None, desc=None, **kwargs):
+        assert iterable is None
+        self.total = total
+        self.desc = desc or ""
+        self.n = 0
+        self.closed = False
+
+    def set_description(self, desc):
+        self.desc = desc
+
+    def update(self, n=1):
+        self.n += n
+
+    def close(self):
+        self.closed = True
+
+    @classmethod
+    def write(cls, s):
+        pass
+
+
+class numbers(object):
+    """Async iterable of range(n) (async generators need python 3.6)."""
+
+    def __init__(self, n):
+        self._it = iter(range(n))
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        await asyncio.sleep(0)
+        try:
+            return next(self._it)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class TestAsyncProgress:
+    def test_async_for(self):
+        logger = Loggable("aio_progress", tqdm=CountingBar)
+        logger.set_level("INFO")
+        bar = logger.tqdm(numbers(5), "INFO", total=5)
+        assert isinstance(bar, AsyncProgress)
+
+        async def consume():
+            seen = []
+            async for x in bar:
+                seen.append((x, bar.n))
+            return seen
+
+        assert run(consume()) == [(i, i) for i in range(5)]
+        assert bar.n == 5 and bar.total == 5 and bar.closed
+        assert bar.desc.startswith("INFO")
+
+    def test_disabled_returns_iterable(self):
+        logger = Loggable("aio_progress_disabled", tqdm=CountingBar)
+        logger.set_level("WARNING")
+        iterable = numbers(3)
+        assert logger.tqdm(iterable, "INFO") is iterable
+
+    def test_progress_loggable(self):
+        logger = ProgressLoggable(
+            "aio_progress_loggable", "INFO", 3, "numbers", tqdm=CountingBar
+        )
+        logger.set_level("INFO")
+
+        async def consume():
+            seen = []
+            async for x in logger(numbers(3)):
+                seen.append(x)
+            return seen
+
+        assert run(consume()) == [0, 1, 2]
+
+
+class TestAsyncTimed:
+    def test_async_with(self, monkeypatch):
+        tracer = Tracer()
+        monkeypatch.setattr(TimedLoggable, "tracer", tracer)
+        logger = Loggable("aio_timed")
+
+        async def work(name):
+            async with logger.timeit("DEBUG", prefix=name):
+                await asyncio.sleep(0)
+                async with logger.timeit("DEBUG", prefix="inner"):
+                    await asyncio.sleep(0.01)
+            return id(current_task())
+
+        async def main():
+            return await asyncio.gather(work("a"), work("b"))
+
+        tasks = run(main())
+        # interleaved tasks keep their own nesting
+        assert tracer.root.children["a"].children["inner"].count == 1
+        assert tracer.root.children["b"].children["inner"].count == 1
+        assert set(tracer.root.children) == {"a", "b"}
+        tids = {e["name"]: e["tid"] for e in tracer.chrome_trace()["traceEvents"]}
+        assert {tids["a"], tids["b"]} == set(tasks)
+
+
+class TestAsyncWriter:
+    def test_helpers_outside_loop(self):
+        assert current_task() is None
+        assert not in_event_loop()
+
+    def test_aflush_and_aclose(self, capsys):
+        enable_async()
+        logger = Loggable("aio_writer")
+        logger.set_level("INFO")
+
+        async def main():
+            logger.info("from a task")
+            assert await TqdmLoggingHandler.writer.aflush(5)
+            await adisable_async(5)
+
+        run(main())
+        assert TqdmLoggingHandler.writer is None
+        assert "from a task" in capsys.readouterr().out
+
+    def test_full_queue_does_not_block_loop(self):
+        gate = threading.Event()
+
+        class SlowTqdm(object):
+            @classmethod
+            def write(cls, s):
+                gate.wait(5)
+
+        writer = enable_async(maxsize=1, drop_on_loop=True)
+        try:
+            logger = Loggable("aio_writer_full", tqdm=SlowTqdm)
+            logger.set_level("INFO")
+
+            async def main():
+                for i in range(10):
+                    logger.info("msg %d", i)
+
+            run(main())
+            assert sum(writer.dropped.values()) >= 7
+        finally:
+            gate.set()
+            disable_async()
+
+    def test_full_queue_blocks_loop_by_default(self):
+        gate = threading.Event()
+
+        class SlowTqdm(object):
+            @classmethod
+            def write(cls, s):
+                gate.wait(5)
+
+        writer = enable_async(maxsize=1)
+        timer = threading.Timer(0.1, gate.set)
+        try:
+            logger = Loggable("aio_writer_blocks", tqdm=SlowTqdm)
+            logger.set_level("INFO")
+
+            async def main():
+                for i in range(5):
+                    logger.info("msg %d", i)
+
+            timer.start()
+            run(main())
+            assert writer.flush(timeout=5)
+            assert not writer.dropped
+        finally:
+            gate.set()
+            timer.cancel()
+            disable_async()
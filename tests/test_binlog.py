@@ -0,0 +1,158 @@
+import io
+import logging
+import subprocess
+import sys
+
+import pytest
+
+from loggable import Loggable, BinaryLogHandler, BinaryLogReader
+from loggable.__main__ import main
+from loggable.binlog import binary_log
+from loggable.formatters import PlainFormatter
+
+
+@pytest.fixture
+def path(tmpdir):
+    return str(tmpdir.join("test.lgb"))
+
+
+def write_records(path):
+    logger = Loggable("binlog_test")
+    other = Loggable("binlog_other")
+    logger.set_level("DEBUG")
+    other.set_level("DEBUG")
+    handlers = [BinaryLogHandler(path), BinaryLogHandler(path)]
+    logger.add_handler(handlers[0])
+    other.add_handler(handlers[1])
+    try:
+        for i in range(10):
+            logger.debug("value %d is %s (%.1f)", i, None if i % 2 else "even", i / 2)
+        logger.info("plain message")
+        other.warn("other %s", "logger")
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            logger.logger.exception("failed %d", 1)
+    finally:
+        logger.remove_handler(handlers[0])
+        other.remove_handler(handlers[1])
+    binary_log(path).close()
+
+
+class TestBinaryLog(object):
+    def test_round_trip(self, path):
+        write_records(path)
+        with BinaryLogReader(path) as reader:
+            records = list(reader.records())
+        assert len(records) == 13
+        assert records[0].getMessage() == "value 0 is even (0.0)"
+        assert records[1].getMessage() == "value 1 is None (0.5)"
+        assert records[0].levelname == "DEBUG"
+        assert records[10].getMessage() == "plain message"
+        assert records[11].name == "binlog_other"
+        assert "ValueError: boom" in records[12].exc_text
+        assert records[0].created <= records[12].created
+
+    def test_strings_are_interned(self, path):
+        write_records(path)
+        with BinaryLogReader(path) as reader:
+            strings = sorted(reader.strings.values())
+        assert strings.count("value %d is %s (%.1f)") == 1
+        assert "binlog_test" in strings
+        assert "plain message" not in strings
+
+    def test_filters(self, path):
+        write_records(path)
+        with BinaryLogReader(path) as reader:
+            assert len(list(reader.offsets(level="WARNING"))) == 2
+            assert len(list(reader.offsets(name="binlog_o*"))) == 1
+            records = list(reader.records())
+            middle = records[5].created
+            assert all(r.created >= middle for r in reader.records(start=middle))
+            assert len(list(reader.offsets(end=0))) == 0
+
+    def test_append_keeps_string_ids(self, path):
+        write_records(path)
+        write_records(path)
+        with BinaryLogReader(path) as reader:
+            assert len(list(reader.records())) == 26
+            assert len(reader.strings) == len(set(reader.strings.values()))
+
+    def test_replay(self, path):
+        write_records(path)
+        out = io.StringIO()
+        with BinaryLogReader(path) as reader:
+            n = reader.replay(
+                PlainFormatter("%(levelname)s %(message)s"), out, level="INFO"
+            )
+        assert n == 3
+        assert out.getvalue().startswith("INFO plain message\nWARNING other logger\n")
+
+    def test_cli(self, path, capsys):
+        write_records(path)
+        capsys.readouterr()
+        main([path, "--count", "--level", "warning"])
+        out, _ = capsys.readouterr()
+        assert out.strip() == "2"
+        main([path, "--name", "binlog_other", "--output", "plain"])
+        out, _ = capsys.readouterr()
+        assert "WARNING - binlog_other - " in out
+        assert out.strip().endswith("other logger")
+
+    def test_non_scalar_args_are_rendered(self, path):
+        handler = BinaryLogHandler(path)
+        args = ([1, "a"], {"k": b"v"}, 2**70)
+        handler.handle(
+            logging.LogRecord(
+                "binlog_test", logging.INFO, "", 0, "%r %r %d", args, None
+            )
+        )
+        binary_log(path).close()
+        with BinaryLogReader(path) as reader:
+            (record,) = reader.records()
+            assert "%r %r %d" not in reader.strings.values()
+        assert record.getMessage() == "%r %r %d" % args
+
+    def test_options_reconfigure_the_writer(self, path):
+        logger = Loggable("binlog_options")
+        logger.set_level("INFO")
+        handler = BinaryLogHandler(path)
+        logger.add_handler(handler)
+        try:
+            logger.info("before")
+            writer = binary_log(path, buffer_size=16, flush_level="CRITICAL")
+            assert writer is handler.binlog
+            assert writer.flush_level == logging.CRITICAL
+            logger.info("after")
+        finally:
+            logger.remove_handler(handler)
+        writer.close()
+        with BinaryLogReader(path) as reader:
+            messages = [r.getMessage() for r in reader.records()]
+        assert messages == ["before", "after"]
+        with pytest.raises(TypeError):
+            binary_log(path, buffersize=1)
+
+    def test_imported_lazily(self):
+        code = (
+            "import sys, loggable; "
+            "assert 'loggable.binlog' not in sys.modules; "
+            "assert 'argparse' not in sys.modules; "
+            "loggable.BinaryLogReader; "
+            "assert 'loggable.binlog' in sys.modules"
+        )
+        subprocess.check_call([sys.executable, "-c", code])
+
+    def test_run_as_module(self, path):
+        write_records(path)
+        out = subprocess.check_output(
+            [sys.executable, "-W", "error", "-m", "loggable", path, "--count"]
+        )
+        assert out.strip() == b"13"
+
+    def test_not_a_binary_log(self, tmpdir):
+        path = tmpdir.join("text.log")
+        path.write("text")
+        tmpdir.join("text.log.idx").write("")
+        with pytest.raises(ValueError):
+            BinaryLogReader(str(path))
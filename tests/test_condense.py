@@ -0,0 +1,86 @@
+from loggable import condense_long_lists
+import pprint
+
+
+def test_long_list():
+    condensed = condense_long_lists({"a": list(range(100))}, max_list_len=10)
+    assert repr(condensed["a"]) == "[0, 1, 2, 3, 4, ...(90 more), 95, 96, 97, 98, 99]"
+
+
+def test_short_list_is_copied():
+    data = [1, 2, 3]
+    condensed = condense_long_lists(data)
+    assert condensed == data
+    assert condensed is not data
+
+
+def test_leaves_are_not_stringified():
+    condensed = condense_long_lists({"a": 1, "b": None, "c": 1.5})
+    assert condensed == {"a": 1, "b": None, "c": 1.5}
+
+
+def test_max_list_len_is_nested():
+    condensed = condense_long_lists({"a": {"b": list(range(100))}}, max_list_len=4)
+    assert len(condensed["a"]["b"]) == 5
+
+
+def test_tuples_and_sets():
+    condensed = condense_long_lists(
+        {"t": tuple(range(100)), "s": set(range(100))}, max_list_len=4
+    )
+    assert isinstance(condensed["t"], tuple)
+    assert len(condensed["t"]) == 5
+    assert isinstance(condensed["s"], set)
+    assert len(condensed["s"]) == 5
+
+
+def test_generators_are_not_consumed():
+    gen = (x for x in range(10))
+    pprint.pformat(condense_long_lists({"g": gen}))
+    assert list(gen) == list(range(10))
+
+
+def test_max_depth():
+    condensed = condense_long_lists({"a": {"b": {"c": [1]}}}, max_depth=2)
+    assert pprint.pformat(condensed) == "{'a': {'b': {...}}}"
+
+
+def test_max_str_len():
+    condensed = condense_long_lists({"s": "x" * 100}, max_str_len=10)
+    assert condensed["s"] == "xxxxxxxxxx...(90 more)"
+
+
+def test_long_keys_are_truncated():
+    data = {"k" * 100 + "1": 1, "k" * 100 + "2": 2, b"b" * 100: 3}
+    condensed = condense_long_lists(data, max_str_len=10)
+    assert len(condensed) == 3
+    assert "kkkkkkkkkk...(91 more)" in condensed
+    assert max(len(pprint.pformat(k)) for k in condensed) < 40
+
+
+def test_bytes_are_sliced_before_conversion():
+    condensed = condense_long_lists({"b": b"\x00" * 10**6}, max_str_len=10)
+    assert pprint.pformat(condensed) == (
+        "{'b': b'\\x00\\x00\\x00\\x00\\x00\\x00\\x00\\x00\\x00\\x00'"
+        "...(999990 more bytes)}"
+    )
+
+
+def test_objects_are_truncated_lazily():
+    class Big(object):
+        calls = 0
+
+        def __str__(self):
+            Big.calls += 1
+            return "y" * 100
+
+    condensed = condense_long_lists({"o": Big()}, max_str_len=10)
+    assert Big.calls == 0
+    assert pprint.pformat(condensed) == "{'o': yyyyyyyyyy...(90 more)}"
+
+
+def test_max_items():
+    data = {str(i): list(range(10)) for i in range(1000)}
+    condensed = condense_long_lists(data, max_items=100)
+    assert len(condensed) < 100
+    assert "more" in pprint.pformat(condensed)
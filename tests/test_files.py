@@ -0,0 +1,167 @@
+import glob
+import gzip
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from loggable import Loggable, LoggableFactory
+from loggable.files import FileSink, file_sink
+
+
+@pytest.fixture
+def path(tmpdir):
+    return str(tmpdir.join("logs", "test.log"))
+
+
+def read(path):
+    with open(path) as f:
+        return f.read()
+
+
+class TestFileSink(object):
+    def test_buffers_until_size(self, path):
+        sink = FileSink(path, buffer_size=100, flush_interval=60)
+        try:
+            sink.write("a" * 10)
+            assert read(path) == ""
+            for _ in range(10):
+                sink.write("b" * 10)
+            assert read(path).startswith("a" * 10 + "\n")
+            assert sink.metrics()["flushes"] == 1
+        finally:
+            sink.close()
+        assert read(path).count("\n") == 11
+
+    def test_flush_level(self, path):
+        sink = FileSink(path, flush_interval=60, flush_level="ERROR")
+        try:
+            sink.write("info", 20)
+            assert read(path) == ""
+            sink.write("error", 40)
+            assert read(path) == "info\nerror\n"
+        finally:
+            sink.close()
+
+    def test_flush_interval(self, path):
+        sink = FileSink(path, flush_interval=0.01)
+        try:
+            sink.write("timed")
+            deadline = time.time() + 5
+            while not read(path) and time.time() < deadline:
+                time.sleep(0.01)
+            assert read(path) == "timed\n"
+        finally:
+            sink.close()
+
+    def test_rotate_and_compress(self, path):
+        sink = FileSink(path, buffer_size=1, max_bytes=50, backup_count=2)
+        try:
+            for i in range(20):
+                sink.write("line {:02d} ".format(i) * 3)
+            assert sink.wait_for_compression(timeout=5)
+            metrics = sink.metrics()
+        finally:
+            sink.close()
+        assert metrics["rotations"] == 10
+        assert metrics["compressed"] == 10
+        segments = sorted(glob.glob(path + ".*"))
+        assert len(segments) == 2
+        assert all(s.endswith(".gz") for s in segments)
+        with gzip.open(segments[-1], "rt") as f:
+            assert "line 19" in f.read()
+
+    def test_rotate_interval(self, path):
+        sink = FileSink(path, buffer_size=1, rotate_interval=0, compress=False)
+        try:
+            sink.write("first")
+            sink.write("second")
+        finally:
+            sink.close()
+        assert len(glob.glob(path + ".*")) == 2
+
+    def test_prune_keeps_unrelated_files(self, path):
+        os.makedirs(os.path.dirname(path))
+        unrelated = [path + ".bak", path + ".1", path + ".20190729-131912.gz"]
+        for name in unrelated:
+            with open(name, "w") as f:
+                f.write("keep")
+        sink = FileSink(path, buffer_size=1, max_bytes=1, backup_count=1)
+        try:
+            for i in range(3):
+                sink.write("line {}".format(i))
+            assert sink.wait_for_compression(timeout=5)
+        finally:
+            sink.close()
+        assert all(os.path.exists(name) for name in unrelated)
+        assert len(glob.glob(path + ".*-*-*.gz")) == 1
+
+    def test_metrics(self, path):
+        sink = FileSink(path, buffer_size=1)
+        try:
+            sink.write("x" * 9)
+            metrics = sink.metrics()
+        finally:
+            sink.close()
+        assert metrics["bytes_written"] == 10
+        assert metrics["records_written"] == 1
+        assert metrics["flush_latency_max"] >= 0
+
+    def test_closed(self, path):
+        sink = FileSink(path)
+        sink.close()
+        with pytest.raises(ValueError):
+            sink.write("closed")
+
+
+class TestLoggableFile(object):
+    def test_imported_lazily(self):
+        code = (
+            "import sys, loggable; "
+            "assert 'loggable.files' not in sys.modules; "
+            "assert 'gzip' not in sys.modules; "
+            "loggable.file_sink; "
+            "assert 'loggable.files' in sys.modules"
+        )
+        subprocess.check_call([sys.executable, "-c", code])
+
+    def test_writes_plain_records(self, path, capsys):
+        logger = Loggable("file_test", file=path)
+        logger.set_level("INFO")
+        logger.info("to the file")
+        logger.debug("not written")
+        file_sink(path).flush()
+        out, _ = capsys.readouterr()
+        assert not out
+        content = read(path)
+        assert "INFO - file_test - " in content
+        assert content.endswith("to the file\n")
+        assert "\x1b" not in content
+        assert "not written" not in content
+
+    def test_options_reconfigure_the_sink(self, path):
+        logger = Loggable("file_test_options", file=path)
+        logger.set_level("INFO")
+        logger.info("before")
+        sink = file_sink(path, buffer_size=1, flush_level="CRITICAL")
+        assert sink is file_sink(path)
+        assert sink.buffer_size == 1
+        assert sink.flush_level == 50
+        logger.info("after")
+        lines = read(path).splitlines()
+        assert [line.split(" - ")[-1] for line in lines] == ["before", "after"]
+        with pytest.raises(TypeError):
+            file_sink(path, buffersize=1)
+
+    def test_children_and_factory(self, path):
+        logger = LoggableFactory(file=path, output="json")("file_test_factory")
+        logger.set_level("INFO")
+        with logger.timeit("INFO", prefix="block"):
+            pass
+        file_sink(path).flush()
+        lines = read(path).splitlines()
+        assert len(lines) == 2
+        assert all(line.startswith("{") for line in lines)
+        assert os.path.dirname(file_sink(path).path) == os.path.dirname(path)
@@ -0,0 +1,147 @@
+from loggable import Loggable, LoggableFactory
+from loggable.formatters import (
+    ColorFormatter,
+    PlainFormatter,
+    JSONFormatter,
+    new_formatter,
+)
+from colorlog import ColoredFormatter
+from uuid import uuid4
+import json
+import logging
+import pytest
+import sys
+
+
+def make_record(msg="message %d", args=(1,), exc_info=None):
+    return logging.LogRecord("name", logging.INFO, __file__, 1, msg, args, exc_info)
+
+
+class TestPlainFormatter(object):
+    def test_matches_logging_formatter(self):
+        fmt = "%(levelname)-8s - %(name)s - %(asctime)s - %(message)s"
+        record = make_record()
+        assert PlainFormatter(fmt).format(record) == logging.Formatter(fmt).format(
+            record
+        )
+
+    def test_drops_color_fields(self):
+        record = make_record()
+        s = PlainFormatter(Loggable.DEFAULT_FORMAT).format(record)
+        assert "\x1b" not in s
+        assert s.startswith("INFO - name - ")
+        assert s.endswith(" - message 1")
+
+    def test_literal_percent(self):
+        assert PlainFormatter("100%% %(message)s").format(make_record()) == (
+            "100% message 1"
+        )
+
+    def test_exception(self):
+        try:
+            raise ValueError("bad")
+        except ValueError:
+            record = make_record(exc_info=sys.exc_info())
+        s = PlainFormatter("%(message)s").format(record)
+        assert s.startswith("message 1\nTraceback")
+        assert "ValueError: bad" in s
+
+    def test_cached_time(self):
+        fmt = "%(asctime)s %(message)s"
+        formatter = PlainFormatter(fmt)
+        for created in (1000.25, 1000.5, 1001.0, 1000.75):
+            record = make_record()
+            record.created = created
+            record.msecs = (created - int(created)) * 1000
+            assert formatter.format(record) == logging.Formatter(fmt).format(record)
+
+    def test_cached_headers(self):
+        fmt = "%(levelname)-8s %(name)s %(levelno)d %(message)s"
+        formatter = PlainFormatter(fmt)
+        for name, level in [("a", logging.INFO), ("b%s", logging.INFO)] * 2 + [
+            ("a", logging.ERROR)
+        ]:
+            record = logging.LogRecord(name, level, __file__, 1, "100%", (), None)
+            assert formatter.format(record) == logging.Formatter(fmt).format(record)
+        assert len(formatter._templates) == 3
+
+
+class TestColorFormatter(object):
+    @pytest.mark.parametrize(
+        "fmt",
+        [
+            Loggable.DEFAULT_FORMAT,
+            "%(log_color)s%(levelname)-8s%(reset)s %(bold)s%(name)s%(reset)s %(message)s",
+            "%(message)s",
+        ],
+    )
+    def test_matches_colorlog(self, fmt):
+        colorlog_formatter = ColoredFormatter(fmt, log_colors=Loggable.DEFAULT_COLORS)
+        formatter = ColorFormatter(fmt, log_colors=Loggable.DEFAULT_COLORS)
+        for level in (logging.DEBUG, logging.INFO, logging.ERROR, logging.INFO):
+            record = logging.LogRecord("name", level, __file__, 1, "msg", (), None)
+            assert formatter.format(record) == colorlog_formatter.format(record)
+
+
+class TestJSONFormatter(object):
+    def test_field_order(self):
+        s = JSONFormatter().format(make_record('quoted "%s"', ("value",)))
+        d = json.loads(s)
+        assert list(d) == ["created", "levelname", "name", "message"]
+        assert d["message"] == 'quoted "value"'
+        assert d["levelname"] == "INFO"
+
+    def test_custom_fields(self):
+        s = JSONFormatter(fields=["levelno", "message", "asctime"]).format(
+            make_record()
+        )
+        d = json.loads(s)
+        assert list(d) == ["levelno", "message", "asctime"]
+        assert d["levelno"] == logging.INFO
+
+    def test_exception(self):
+        try:
+            raise ValueError("bad")
+        except ValueError:
+            record = make_record(exc_info=sys.exc_info())
+        d = json.loads(JSONFormatter().format(record))
+        assert "ValueError: bad" in d["exc_text"]
+
+
+class TestOutput(object):
+    def test_auto(self):
+        class Stream(object):
+            def __init__(self, tty):
+                self.tty = tty
+
+            def isatty(self):
+                return self.tty
+
+        assert isinstance(new_formatter(stream=Stream(True)), ColorFormatter)
+        assert isinstance(new_formatter(stream=Stream(False)), PlainFormatter)
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            Loggable("output_test", output="xml")
+
+    @pytest.mark.parametrize("output", ["plain", "json"])
+    def test_loggable_output(self, output, capsys):
+        logger = Loggable("output_test_" + output, output=output)
+        logger.set_level("INFO")
+        msg = str(uuid4())
+        logger.info(msg)
+        log, _ = capsys.readouterr()
+        assert msg in log
+        assert "\x1b" not in log
+        if output == "json":
+            assert json.loads(log)["message"] == msg
+
+    def test_inherited_by_children(self):
+        logger = Loggable("output_test_children", output="json")
+        assert logger.spawn("child").output == "json"
+        assert logger.timeit("INFO").output == "json"
+        assert logger.track("INFO").output == "json"
+
+    def test_factory(self):
+        factory = LoggableFactory(output="plain")
+        assert factory("output_test_factory").output == "plain"
@@ -0,0 +1,333 @@
+from loggable import (
+    Loggable,
+    AsyncWriter,
+    FlightRecorder,
+    enable_async,
+    disable_async,
+)
+import logging
+import threading
+import pytest
+
+
+@pytest.fixture
+def async_writer():
+    def make(**kwargs):
+        return enable_async(**kwargs)
+
+    yield make
+    disable_async()
+
+
+class RecordingTqdm(object):
+    """Stand-in for the tqdm class that records writes and can be paused."""
+
+    writes = []
+    gate = threading.Event()
+
+    @classmethod
+    def write(cls, s):
+        cls.gate.wait(5)
+        cls.writes.append(s)
+
+    @classmethod
+    def reset(cls):
+        cls.writes = []
+        cls.gate.set()
+
+
+class TestAsyncWriter(object):
+    def test_writes_after_flush(self, async_writer, capsys):
+        writer = async_writer()
+        logger = Loggable("async_test")
+        logger.set_level("INFO")
+        for i in range(100):
+            logger.info("msg %d", i)
+        assert writer.flush(5)
+        log, _ = capsys.readouterr()
+        expected = ["msg {}".format(i) for i in range(100)]
+        assert [m for m in expected if m in log] == expected
+        assert log.index("msg 10") < log.index("msg 99")
+
+    def test_batches_writes(self, async_writer):
+        RecordingTqdm.reset()
+        RecordingTqdm.gate.clear()
+        writer = async_writer(batch_size=1000)
+        logger = Loggable("async_batch", tqdm=RecordingTqdm)
+        logger.set_level("INFO")
+        logger.info("first")
+        for i in range(50):
+            logger.info("msg %d", i)
+        RecordingTqdm.gate.set()
+        writer.flush(5)
+        assert len(RecordingTqdm.writes) <= 2
+        assert "\n".join(RecordingTqdm.writes).count("msg") == 50
+
+    def test_failed_write_is_counted(self, async_writer, capsys):
+        class BrokenTqdm(object):
+            @classmethod
+            def write(cls, s):
+                raise ValueError("I/O operation on closed file")
+
+        writer = async_writer()
+        logger = Loggable("async_broken", tqdm=BrokenTqdm)
+        logger.set_level("INFO")
+        for i in range(3):
+            logger.info("msg %d", i)
+        writer.flush(5)
+        assert writer.dropped_total == 3
+        assert "closed file" in capsys.readouterr().err
+
+    def test_drop_oldest(self, async_writer):
+        RecordingTqdm.reset()
+        RecordingTqdm.gate.clear()
+        writer = async_writer(maxsize=5, overflow=AsyncWriter.DROP_OLDEST)
+        logger = Loggable("async_drop_oldest", tqdm=RecordingTqdm)
+        logger.set_level("INFO")
+        for i in range(20):
+            logger.info("msg %d", i)
+        RecordingTqdm.gate.set()
+        writer.flush(5)
+        out = "\n".join(RecordingTqdm.writes)
+        assert "msg 19" in out
+        assert writer.dropped_total > 0
+        assert writer.dropped_total + out.count("msg") == 20
+        assert writer.dropped[logging.INFO] == writer.dropped_total
+
+    def test_drop_below(self, async_writer):
+        RecordingTqdm.reset()
+        RecordingTqdm.gate.clear()
+        writer = async_writer(
+            maxsize=2, overflow=AsyncWriter.DROP_BELOW, drop_level=logging.ERROR
+        )
+        logger = Loggable("async_drop_below", tqdm=RecordingTqdm)
+        logger.set_level("INFO")
+        for i in range(10):
+            logger.info("msg %d", i)
+        threading.Timer(0.1, RecordingTqdm.gate.set).start()
+        logger.error("important")
+        writer.flush(5)
+        assert "important" in "\n".join(RecordingTqdm.writes)
+        assert writer.dropped.get(logging.INFO, 0) > 0
+        assert logging.ERROR not in writer.dropped
+
+    def test_close_writes_remaining(self, async_writer, capsys):
+        writer = async_writer()
+        logger = Loggable("async_close")
+        logger.set_level("INFO")
+        logger.info("last message")
+        disable_async()
+        log, _ = capsys.readouterr()
+        assert "last message" in log
+        with pytest.raises(ValueError):
+            writer.put(None, None)
+
+    def test_invalid_policy(self):
+        with pytest.raises(ValueError):
+            AsyncWriter(overflow="nope")
+
+
+class TestFlightRecorder(object):
+    def test_dumps_context_on_trigger(self, capsys):
+        logger = Loggable("recorder_test", output="plain")
+        logger.set_level("ERROR")
+        recorder = logger.flight_recorder(capacity=3)
+        try:
+            for i in range(5):
+                logger.debug("step %d", i)
+            out, _ = capsys.readouterr()
+            assert not out
+
+            logger.error("failed")
+            out, _ = capsys.readouterr()
+            lines = out.splitlines()
+            assert "Flight recorder: the last 3 records" in lines[0]
+            assert lines[0].startswith("DEBUG")
+            assert [line.split(" - ")[-1] for line in lines[1:]] == [
+                "step 2",
+                "step 3",
+                "step 4",
+                "failed",
+            ]
+            assert lines[1].startswith("DEBUG")
+        finally:
+            logger.remove_handler(recorder)
+
+    def test_dump_on_demand(self, capsys):
+        logger = Loggable("recorder_test", output="plain")
+        logger.set_level("ERROR")
+        recorder = logger.flight_recorder(capture_level="INFO")
+        try:
+            logger.debug("not captured")
+            logger.info("captured")
+            assert recorder.dump() == 1
+            out, _ = capsys.readouterr()
+            assert "captured" in out
+            assert "not captured" not in out
+            assert recorder.dump() == 0
+        finally:
+            logger.remove_handler(recorder)
+
+    def test_messages_are_not_rendered(self):
+        logger = Loggable("recorder_test")
+        logger.set_level("ERROR")
+        recorder = FlightRecorder()
+        logger.add_handler(recorder)
+        calls = []
+
+        def expensive():
+            calls.append(1)
+            return "expensive"
+
+        try:
+            logger.debug(expensive)
+            assert not calls
+            records = recorder.records()
+            assert records[0].getMessage() == "expensive"
+            assert calls
+        finally:
+            logger.remove_handler(recorder)
+
+    def test_does_not_follow_level(self):
+        logger = Loggable("recorder_test")
+        recorder = logger.flight_recorder()
+        try:
+            logger.set_level("CRITICAL")
+            assert recorder.level == logging.DEBUG
+            assert logger.level_name() == "CRITICAL"
+        finally:
+            logger.remove_handler(recorder)
+
+
+class TestCollapseRepeats(object):
+    def make_logger(self, interval=60):
+        RecordingTqdm.reset()
+        logger = Loggable(
+            "repeats_" + str(id(self)), tqdm=RecordingTqdm, output="plain"
+        )
+        logger.set_level("INFO")
+        logger.collapse_repeats(interval)
+        return logger
+
+    def test_run_is_collapsed(self):
+        logger = self.make_logger()
+        for _ in range(1000):
+            logger.info("retrying %s", "host")
+        logger.info("connected")
+        lines = [line.split(" - ")[-1] for line in RecordingTqdm.writes]
+        assert lines == [
+            "retrying host",
+            "last message repeated 999 times",
+            "connected",
+        ]
+
+    def test_level_and_logger_are_compared(self):
+        logger = self.make_logger()
+        logger.info("same")
+        logger.error("same")
+        record = logging.LogRecord("other", logging.ERROR, "", 0, "same", (), None)
+        logger._resolve().handler.handle(record)
+        assert len(RecordingTqdm.writes) == 3
+        assert not any("repeated" in line for line in RecordingTqdm.writes)
+
+    def test_exceptions_are_not_held(self):
+        logger = self.make_logger()
+        for _ in range(2):
+            try:
+                raise ValueError("bad")
+            except ValueError:
+                logger.logger.exception("failed")
+        assert sum("Traceback" in line for line in RecordingTqdm.writes) == 2
+
+    def test_time_bound(self):
+        logger = self.make_logger(interval=0.05)
+        logger.info("poll")
+        logger.info("poll")
+        logger.info("poll")
+        for _ in range(100):
+            if len(RecordingTqdm.writes) == 2:
+                break
+            threading.Event().wait(0.01)
+        assert RecordingTqdm.writes[-1].endswith("last message repeated 2 times")
+
+    def test_flush_and_disable(self):
+        logger = self.make_logger()
+        logger.info("poll")
+        logger.info("poll")
+        logger.collapse_repeats(None)
+        logger.info("poll")
+        assert [line.split(" - ")[-1] for line in RecordingTqdm.writes] == [
+            "poll",
+            "last message repeated 1 times",
+            "poll",
+        ]
+
+
+class TestLogMany(object):
+    def make_logger(self, name):
+        RecordingTqdm.reset()
+        logger = Loggable(name, tqdm=RecordingTqdm, output="plain")
+        logger.set_level("INFO")
+        return logger
+
+    def test_single_write(self):
+        logger = self.make_logger("log_many")
+        logger.log_many(("item {}".format(i) for i in range(100)), "INFO")
+        assert len(RecordingTqdm.writes) == 1
+        lines = RecordingTqdm.writes[0].split("\n")
+        assert [line.split(" - ")[-1] for line in lines] == [
+            "item {}".format(i) for i in range(100)
+        ]
+        assert all(line.startswith("INFO - log_many - ") for line in lines)
+
+    def test_disabled_level(self):
+        logger = self.make_logger("log_many_disabled")
+
+        def message():
+            raise AssertionError("rendered")
+
+        logger.log_many([message], "DEBUG")
+        assert RecordingTqdm.writes == []
+
+    def test_pairs(self):
+        logger = self.make_logger("log_pairs")
+        logger.log_pairs(
+            [("INFO", "a"), ("DEBUG", "hidden"), ("ERROR", lambda: "b"), (20, "c")]
+        )
+        assert len(RecordingTqdm.writes) == 1
+        assert [
+            line.split(" - ")[0] + " " + line.split(" - ")[-1]
+            for line in RecordingTqdm.writes[0].split("\n")
+        ] == ["INFO a", "ERROR b", "INFO c"]
+
+    def test_recorder_keeps_order(self):
+        logger = self.make_logger("log_pairs_recorder")
+        recorder = logger.flight_recorder()
+        try:
+            logger.log_pairs([("ERROR", "boom"), ("DEBUG", "after")])
+            recorder.dump()
+        finally:
+            logger.remove_handler(recorder)
+        messages = [
+            line.split(" - ")[-1]
+            for line in "\n".join(RecordingTqdm.writes).split("\n")
+        ]
+        assert messages == ["boom", "Flight recorder: the last 1 records", "after"]
+
+    def test_logging_disable(self):
+        logger = self.make_logger("log_many_logging_disable")
+        logging.disable(logging.CRITICAL)
+        try:
+            logger.info("single")
+            logger.log_many(["batch"], "INFO")
+        finally:
+            logging.disable(logging.NOTSET)
+        assert RecordingTqdm.writes == []
+
+    def test_async(self, async_writer):
+        logger = self.make_logger("log_many_async")
+        writer = async_writer()
+        logger.log_many(map(str, range(10)), "INFO")
+        writer.flush(5)
+        lines = "\n".join(RecordingTqdm.writes).split("\n")
+        assert [line.split(" - ")[-1] for line in lines] == list(map(str, range(10)))
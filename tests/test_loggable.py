@@ -5,6 +5,8 @@ import time
 import pytest
 import logging
 import pickle
+import subprocess
+import sys
 
 
 class Foo(object):
@@ -406,3 +408,390 @@ class TestException(object):
             for i in logger.tqdm(range(10), "ERROR"):
                 if i == 5:
                     raise ValueError
+
+
+class TestResolvedCache(object):
+    def test_cache_is_reused(self):
+        logger = Loggable("cache_test")
+        logger.set_level("INFO")
+        state = logger._resolve()
+        logger.info("msg")
+        assert logger._resolve() is state
+
+    def test_set_level_invalidates(self, capsys):
+        logger = Loggable("cache_test")
+        logger.set_level("INFO")
+        logger.info("msg1")
+        logger.set_level("ERROR")
+        logger.info("msg2")
+        log, _ = capsys.readouterr()
+        assert "msg1" in log
+        assert "msg2" not in log
+        assert logger.level_name() == "ERROR"
+
+    def test_set_tb_limit_invalidates(self):
+        logger = Loggable("cache_test")
+        logger.set_tb_limit(0)
+        assert logger._resolve().tb_limit == 0
+        logger.set_tb_limit(5)
+        assert logger._resolve().tb_limit == 5
+        logger.set_tb_limit(0)
+
+    def test_shared_logger_is_coherent(self):
+        logger1 = Loggable("cache_shared")
+        logger2 = Loggable("cache_shared")
+        logger1.set_level("INFO")
+        assert logger2.is_enabled("INFO")
+        logger1.set_level("ERROR")
+        assert not logger2.is_enabled("INFO")
+
+    def test_handler_change_invalidates(self):
+        logger = Loggable("cache_handler")
+        logger.set_level("INFO")
+        primary = logger._resolve().handler
+
+        logger.remove_handler(primary)
+        assert logger._resolve().handler is not primary
+        logger.set_level("DEBUG")
+        assert logger.is_enabled("DEBUG")
+
+
+class TestLevelMethodBinding(object):
+    def test_disabled_methods_are_rebound(self, capsys):
+        logger = Loggable("binding_test")
+        logger.set_level("ERROR")
+        assert "debug" in logger.__dict__
+        assert "info" in logger.__dict__
+        assert "error" not in logger.__dict__
+        logger.info("msg")
+        log, _ = capsys.readouterr()
+        assert not log
+
+        logger.set_level("DEBUG")
+        assert "debug" not in logger.__dict__
+        logger.debug("msg")
+        log, _ = capsys.readouterr()
+        assert "msg" in log
+
+    def test_children_are_rebound(self, capsys):
+        logger = Loggable("binding_parent")
+        logger.set_level("ERROR")
+        child = logger.spawn("binding_child")
+        child.info("msg1")
+
+        logger.set_level("INFO")
+        assert "info" not in child.__dict__
+        child.info("msg2")
+        log, _ = capsys.readouterr()
+        assert "msg1" not in log
+        assert "msg2" in log
+
+    def test_shared_logger_is_rebound(self, capsys):
+        logger1 = Loggable("binding_shared")
+        logger2 = Loggable("binding_shared")
+        logger1.set_level("ERROR")
+        logger2.info("msg")
+        logger1.set_level("INFO")
+        logger2.info("msg2")
+        log, _ = capsys.readouterr()
+        assert "msg2" in log
+
+    def test_change_is_not_fanned_out(self, monkeypatch):
+        binds = []
+        bind = Loggable._bind_level_methods
+        monkeypatch.setattr(
+            Loggable,
+            "_bind_level_methods",
+            lambda self, state: binds.append(self) or bind(self, state),
+        )
+        logger = Loggable("binding_fan_out")
+        logger.set_level("ERROR")
+        children = [logger.spawn() for _ in range(100)]
+        # each spawn rebinds the child only, not every Loggable of the handler
+        assert len(binds) < 5 * len(children)
+        del binds[:]
+        logger.set_level("INFO")
+        assert all(bound is logger for bound in binds)
+        assert children[0].is_enabled("INFO")
+
+    def test_timed_loggable(self, capsys):
+        logger = Loggable("binding_timed")
+        logger.set_level("INFO")
+        with logger.timeit("INFO", "prefix") as timeit:
+            timeit.debug("debugmsg")
+            timeit.info("infomsg")
+        log, _ = capsys.readouterr()
+        assert "debugmsg" not in log
+        assert 'TimedLoggable("prefix"): infomsg' in log
+
+    def test_pickle_drops_bound_methods(self):
+        logger = Loggable("binding_pickle")
+        logger.set_level("ERROR")
+        logger2 = pickle.loads(pickle.dumps(logger))
+        assert "info" not in logger2.__dict__
+        assert not logger2.is_enabled("INFO")
+
+
+class TestLazyMessages(object):
+    def test_args(self, capsys):
+        logger = Loggable("lazy_test")
+        logger.set_level("INFO")
+        logger.info("value=%s, %d", "foo", 5)
+        log, _ = capsys.readouterr()
+        assert "value=foo, 5" in log
+
+    def test_callable_only_called_when_enabled(self, capsys):
+        logger = Loggable("lazy_test")
+        logger.set_level("INFO")
+        calls = []
+
+        def msg():
+            calls.append(1)
+            return "lazy message"
+
+        logger.debug(msg)
+        logger.log(msg, "DEBUG")
+        assert not calls
+
+        logger.info(msg)
+        log, _ = capsys.readouterr()
+        assert calls == [1]
+        assert "lazy message" in log
+
+    def test_pprint_data_is_deferred(self, capsys):
+        logger = Loggable("lazy_test")
+        logger.set_level("INFO")
+        data = {"a": list(range(100))}
+        msg = logger.pprint_data(data)
+        assert msg._rendered is None
+        logger.debug(msg)
+        assert msg._rendered is None
+        logger.info(msg)
+        log, _ = capsys.readouterr()
+        assert "..." in log
+        assert str(msg) == logger.pprint(data)
+
+    def test_timed_prefix_with_args(self, capsys):
+        logger = Loggable("lazy_test")
+        logger.set_level("INFO")
+        timeit = logger.timeit("INFO", "prefix")
+        timeit.info("value=%s", 5)
+        timeit.info(lambda: "from callable")
+        log, _ = capsys.readouterr()
+        assert 'TimedLoggable("prefix"): value=5' in log
+        assert 'TimedLoggable("prefix"): from callable' in log
+
+
+class TestCoalescedProgress(object):
+    class RecordingTqdm(object):
+        def __init__(self, *args, **kwargs):
+            self.n = 0
+            self.updates = 0
+            self.closed = False
+
+        def update(self, n=1):
+            self.n += n
+            self.updates += 1
+
+        def close(self):
+            self.closed = True
+
+    def test_exact_count_from_threads(self):
+        import threading
+
+        logger = Loggable("coalesce_test", tqdm=self.RecordingTqdm)
+        logger.set_level("INFO")
+        track = logger.track("INFO", total=80000, refresh_rate=10).enter()
+        pbar = track.pbar
+
+        def work():
+            for _ in range(10000):
+                track.update(1)
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        track.exit()
+
+        assert pbar.closed
+        assert pbar.n == 80000
+        assert pbar.updates < 1000
+
+    def test_not_enabled(self):
+        logger = Loggable("coalesce_test", tqdm=self.RecordingTqdm)
+        logger.set_level("ERROR")
+        with logger.track("INFO", total=10, refresh_rate=10) as track:
+            track.update(5)
+        assert track.pbar == 0
+
+    def test_pickle(self):
+        logger = Loggable("coalesce_test")
+        track = logger.track("INFO", total=10, refresh_rate=10)
+        track2 = pickle.loads(pickle.dumps(track))
+        assert track2.refresh_rate == 10
+        assert track2._refresh_lock is not track._refresh_lock
+
+
+class SharedFoo(object):
+    def __init__(self):
+        self.log = Loggable(self, output="plain", shared=True)
+
+
+class TestRegistry:
+    def test_children_released_with_owner(self):
+        import gc
+
+        before = len(Loggable.registered)
+        for _ in range(1000):
+            logger = Loggable(Foo())
+            logger.spawn("registry_child")
+            logger.set_level("INFO")
+        del logger
+        gc.collect()
+        assert len(Loggable.registered) <= before
+
+    def test_reading_children_does_not_register(self):
+        before = len(Loggable.registered)
+        for _ in range(100):
+            Loggable("registry_test").set_level("INFO")
+        assert len(Loggable.registered) == before
+
+    def test_unpickled_copy_keeps_children(self):
+        import gc
+
+        logger = Loggable("registry_test")
+        child = logger.spawn()
+        copied = pickle.loads(pickle.dumps(logger))
+        del logger
+        gc.collect()
+        assert copied._children[child._id] is child
+
+
+class TestSharedLoggers:
+    def test_one_native_logger_per_class(self):
+        a, b = SharedFoo(), SharedFoo()
+        assert a.log.logger is b.log.logger
+        assert a.log.name == "{}.SharedFoo".format(__name__)
+
+    def test_records_tagged_with_instance(self, capsys):
+        foo = SharedFoo()
+        foo.log.set_level("INFO")
+        records = []
+
+        class Recorder(logging.Handler):
+            def emit(self, record):
+                records.append(record)
+
+        recorder = Recorder()
+        foo.log.add_handler(recorder)
+        try:
+            foo.log.info("shared")
+        finally:
+            foo.log.remove_handler(recorder)
+        assert records[0].instance_id == id(foo)
+        assert records[0].name == "SharedFoo(id={})".format(id(foo))
+        assert "SharedFoo(id={})".format(id(foo)) in capsys.readouterr().out
+
+    def test_memory_flat_under_churn(self):
+        import gc
+
+        SharedFoo().log.info("warm up")
+        gc.collect()
+        loggers = len(logging.Logger.manager.loggerDict)
+        registered = len(Loggable.registered)
+        for _ in range(1000):
+            foo = SharedFoo()
+            foo.log.spawn().debug("churn")
+            foo.log.set_level("ERROR")
+        del foo
+        gc.collect()
+        assert len(logging.Logger.manager.loggerDict) == loggers
+        assert len(Loggable.registered) <= registered
+
+
+class TestLevelInheritance:
+    def test_children_resolve_lazily(self):
+        logger = Loggable("inherit_parent")
+        logger.set_level("ERROR")
+        child = logger.spawn("inherit_child")
+        handler = logging.getLogger("inherit_child").handlers[0]
+        applied = handler.level_stamp
+
+        logger.set_level("DEBUG")
+        assert handler.level_stamp == applied
+        assert child.level_name() == "DEBUG"
+        assert handler.level_stamp > applied
+
+    def test_child_override_is_respected(self):
+        logger = Loggable("inherit_parent")
+        logger.set_level("ERROR")
+        child = logger.spawn("inherit_child")
+        child.set_level("DEBUG")
+        assert child.level_name() == "DEBUG"
+        assert logger.level_name() == "ERROR"
+
+        logger.set_level("INFO")
+        assert child.level_name() == "INFO"
+
+    def test_grandchildren(self):
+        logger = Loggable("inherit_parent")
+        logger.set_level("ERROR")
+        child = logger.spawn("inherit_child")
+        grandchild = child.spawn("inherit_grandchild")
+        child.set_level("INFO")
+        assert grandchild.level_name() == "INFO"
+
+        logger.set_level("DEBUG")
+        assert grandchild.level_name() == "DEBUG"
+        grandchild.set_level("CRITICAL")
+        assert grandchild.level_name() == "CRITICAL"
+        assert child.level_name() == "DEBUG"
+
+    def test_new_loggable_of_child_name_inherits(self):
+        logger = Loggable("inherit_parent")
+        logger.set_level("ERROR")
+        child = logger.spawn("inherit_native")
+        logger.set_level("DEBUG")
+        assert Loggable("inherit_native").is_enabled("DEBUG")
+        assert logging.getLogger("inherit_native").level == logging.DEBUG
+        assert child.level_name() == "DEBUG"
+
+    def test_newer_level_of_shared_native_logger_wins(self):
+        parent = Loggable("inherit_parent")
+        parent.set_level("ERROR")
+        child = parent.spawn("inherit_shared")
+        other = Loggable("inherit_shared")
+        parent.set_level("INFO")
+        other.set_level("ERROR")
+        assert other.level_name() == "ERROR"
+        assert child.level_name() == "ERROR"
+
+    def test_timeit_and_track_children(self):
+        logger = Loggable("inherit_parent")
+        logger.set_level("ERROR")
+        timeit = logger.timeit("INFO")
+        track = logger.track("INFO")
+        logger.set_level("INFO")
+        assert timeit.is_enabled("INFO")
+        assert track.is_enabled("INFO")
+
+
+def test_optional_dependencies_are_imported_lazily():
+    code = (
+        "import sys, loggable\n"
+        "loggable.Loggable('lazy', output='plain').error('failed')\n"
+        "print(sorted(m for m in ('arrow', 'colorlog', 'tqdm') if m in sys.modules))"
+    )
+    out = subprocess.check_output([sys.executable, "-c", code]).decode()
+    assert "ERROR - lazy" in out
+    assert out.splitlines()[-1] == "[]"
+
+
+def test_disabled_level_methods_can_be_chained():
+    logger = Loggable("chained")
+    logger.set_level("ERROR")
+    assert logger.debug("a").info("b") is logger
+    logger.set_level("DEBUG")
+    assert logger.debug("a").info("b") is logger
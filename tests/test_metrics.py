@@ -0,0 +1,132 @@
+import threading
+
+import pytest
+
+from loggable import Loggable, LogMetrics, TqdmLoggingHandler, enable_async
+from loggable import disable_async
+
+
+class NullTqdm(object):
+    @classmethod
+    def write(cls, s):
+        pass
+
+
+@pytest.fixture
+def log_metrics(monkeypatch):
+    counters = LogMetrics()
+    monkeypatch.setattr(Loggable, "log_metrics", counters)
+    monkeypatch.setattr(TqdmLoggingHandler, "log_metrics", counters)
+    return counters
+
+
+def make_logger(name, **kwargs):
+    logger = Loggable(name, tqdm=NullTqdm, output="plain", **kwargs)
+    logger.set_level("INFO")
+    return logger
+
+
+class TestLogMetrics(object):
+    def test_counts(self, log_metrics):
+        logger = make_logger("metrics_counts", format="%(message)s")
+        logger.info("a")
+        logger.info("bb")
+        logger.log("hidden", "DEBUG")
+        logger.error("c")
+        info = logger.metrics()["INFO"]
+        assert (info["calls"], info["emitted"], info["suppressed"]) == (2, 2, 0)
+        assert info["written"] == 2
+        assert info["chars"] == len("a\nbb\n")
+        assert info["format_ns"] > 0 and info["write_ns"] > 0
+        assert logger.metrics()["DEBUG"]["suppressed"] == 1
+        assert logger.metrics()["DEBUG"]["written"] == 0
+        assert log_metrics.snapshot()["metrics_counts"]["ERROR"]["written"] == 1
+
+    def test_reset(self, log_metrics):
+        logger = make_logger("metrics_reset")
+        logger.info("a")
+        log_metrics.reset()
+        assert log_metrics.snapshot() == {}
+        logger.info("b")
+        assert logger.metrics()["INFO"]["calls"] == 1
+
+    def test_threads_are_merged(self, log_metrics):
+        logger = make_logger("metrics_threads")
+
+        def run():
+            for _ in range(100):
+                logger.info("x")
+
+        threads = [threading.Thread(target=run) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert logger.metrics()["INFO"]["written"] == 400
+        # counters of exited threads are kept
+        assert logger.metrics()["INFO"]["written"] == 400
+        assert len(log_metrics._threads) <= 1
+
+    def test_call_style_does_not_matter(self, log_metrics):
+        logger = make_logger("metrics_call_style")
+        for _ in range(1000):
+            logger.debug("x")
+            logger.log("x", "DEBUG")
+        debug = logger.metrics()["DEBUG"]
+        assert (debug["calls"], debug["suppressed"]) == (2000, 2000)
+        log_metrics.enabled = False
+        logger.debug("x")
+        assert logger.metrics()["DEBUG"]["calls"] == 2000
+
+    def test_log_many_counts_suppressed(self, log_metrics):
+        logger = make_logger("metrics_log_many")
+        logger.debug("a")
+        logger.log("b", "DEBUG")
+        logger.log_many(["c", "d"], "DEBUG")
+        debug = logger.metrics()["DEBUG"]
+        assert (debug["calls"], debug["suppressed"]) == (4, 4)
+
+    def test_disabled_methods_count_from_threads(self, log_metrics):
+        logger = make_logger("metrics_disabled_threads")
+
+        def run():
+            for _ in range(1000):
+                logger.debug("x")
+
+        threads = [threading.Thread(target=run) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert logger.metrics()["DEBUG"]["suppressed"] == 4000
+        log_metrics.reset()
+        assert logger.metrics() == {}
+        logger.debug("x")
+        assert logger.metrics()["DEBUG"]["suppressed"] == 1
+
+    def test_disabled(self, log_metrics):
+        log_metrics.enabled = False
+        make_logger("metrics_disabled").info("a")
+        assert log_metrics.snapshot() == {}
+
+    def test_shared_logger(self, log_metrics):
+        class Shared(object):
+            pass
+
+        logger = Loggable(Shared(), shared=True, tqdm=NullTqdm, output="plain")
+        logger.set_level("INFO")
+        logger.info("a")
+        Loggable(Shared(), shared=True).info("b")
+        assert logger.metrics()["INFO"]["written"] == 2
+
+    def test_batch_and_async(self, log_metrics):
+        logger = make_logger("metrics_batch")
+        logger.log_many(["a", "b", "c"], "INFO")
+        writer = enable_async()
+        try:
+            logger.info("d")
+            writer.flush(5)
+        finally:
+            disable_async()
+        info = logger.metrics()["INFO"]
+        assert (info["emitted"], info["written"]) == (4, 4)
@@ -0,0 +1,125 @@
+from loggable import Loggable
+from loggable.multiprocess import LogCollector
+import logging
+import multiprocessing
+import pickle
+import pytest
+
+
+class RecordingTqdm(object):
+    """Stand-in for the tqdm class that records bars and writes."""
+
+    writes = []
+    bars = []
+
+    def __init__(self, iterable=None, total=None, desc=None, **kwargs):
+        self.total = total
+        self.desc = desc
+        self.n = 0
+        self.closed = False
+        RecordingTqdm.bars.append(self)
+
+    def update(self, n=1):
+        self.n += n
+
+    def refresh(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    @classmethod
+    def write(cls, s):
+        cls.writes.append(s)
+
+
+def work(args):
+    logger, x = args
+    logger.info("working on %d", x)
+    logger.debug("not shown")
+    with logger.track("INFO", total=10, desc="progress") as pbar:
+        for _ in range(10):
+            pbar.update(1)
+    return x
+
+
+@pytest.mark.parametrize("method", ["fork", "spawn"])
+def test_collects_from_pool(method):
+    RecordingTqdm.writes = []
+    RecordingTqdm.bars = []
+    logger = Loggable("mp_parent")
+    logger.set_level("INFO")
+
+    context = multiprocessing.get_context(method)
+    with LogCollector(tqdm=RecordingTqdm, context=context) as collector:
+        with context.Pool(2, *collector.initializer()) as pool:
+            assert pool.map(work, [(logger, x) for x in range(4)]) == list(range(4))
+            pool.close()
+            pool.join()
+
+    out = "\n".join(RecordingTqdm.writes)
+    for x in range(4):
+        assert "working on {}".format(x) in out
+    assert "not shown" not in out
+
+    bars = [bar for bar in RecordingTqdm.bars if bar.desc == "progress"]
+    assert len(bars) >= 1
+    assert sum(bar.n for bar in bars) == 40
+    assert all(bar.closed for bar in bars)
+
+
+def test_pickle_restores_level_for_new_logger():
+    """As in a spawned worker, where the native logger does not exist yet."""
+    logger = Loggable("mp_pickle_level")
+    logger.set_level("INFO")
+    s = pickle.dumps(logger)
+    native = logging.getLogger(logger.name)
+    for handler in list(native.handlers):
+        native.removeHandler(handler)
+
+    logger2 = pickle.loads(s)
+    assert "_pickled_level" not in logger2.__dict__
+    assert logger2.level_name() == "INFO"
+
+
+def test_malformed_items_are_reported(capsys):
+    RecordingTqdm.writes = []
+    collector = LogCollector(tqdm=RecordingTqdm)
+    collector.queue.put([("record", None), ("write", "still written")])
+    collector.queue.put(None)
+    collector._run()
+    assert collector.errors == 1
+    assert "Malformed item" in capsys.readouterr().err
+    assert RecordingTqdm.writes == ["still written"]
+
+
+def test_concurrent_updates_are_not_lost():
+    from loggable.multiprocess import Forwarder, RemoteTqdm
+    import threading
+
+    class Queue(object):
+        items = []
+
+        def put(self, batch):
+            self.items.extend(batch)
+
+    queue = Queue()
+    forwarder = Forwarder(queue, interval=0.001)
+    RemoteTqdm.forwarder = forwarder
+    try:
+        bar = RemoteTqdm(total=40000)
+
+        def run():
+            for _ in range(10000):
+                bar.update(1)
+
+        threads = [threading.Thread(target=run) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        bar.close()
+    finally:
+        forwarder.close()
+        RemoteTqdm.forwarder = None
+    assert sum(item[2] for item in queue.items if item[0] == "update") == 40000
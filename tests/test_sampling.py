@@ -0,0 +1,100 @@
+from loggable import Loggable, RateLimit, Sample, FirstThenEvery
+from loggable.sampling import CallSiteSampler
+import pickle
+import time
+
+
+def emit(logger, numbers):
+    for i in numbers:
+        logger.info("msg %d;", i)
+
+
+def emitted(log, numbers):
+    return [i for i in numbers if "msg {};".format(i) in log]
+
+
+def test_rate_limit(capsys):
+    logger = Loggable("sampling_test")
+    logger.set_level("INFO")
+    logger.set_sampling(RateLimit(3, period=0.05))
+    emit(logger, range(10))
+    log, _ = capsys.readouterr()
+    assert emitted(log, range(10)) == [0, 1, 2]
+
+    time.sleep(0.06)
+    emit(logger, range(10, 12))
+    log, _ = capsys.readouterr()
+    assert "Suppressed 7 messages from" in log
+    assert "test_sampling.py" in log
+    assert emitted(log, range(10, 12)) == [10, 11]
+
+
+def test_sample(capsys):
+    logger = Loggable("sampling_test")
+    logger.set_level("INFO")
+    logger.set_sampling(Sample(5))
+    emit(logger, range(11))
+    log, _ = capsys.readouterr()
+    assert emitted(log, range(11)) == [0, 5, 10]
+
+
+def test_first_then_every(capsys):
+    logger = Loggable("sampling_test")
+    logger.set_level("INFO")
+    logger.set_sampling(FirstThenEvery(2, 4))
+    emit(logger, range(11))
+    log, _ = capsys.readouterr()
+    assert emitted(log, range(11)) == [0, 1, 5, 9]
+
+
+def test_call_sites_are_independent(capsys):
+    logger = Loggable("sampling_test")
+    logger.set_level("INFO")
+    logger.set_sampling(RateLimit(1))
+    for i in range(3):
+        logger.info("first site %d", i)
+        logger.log("second site %d", "INFO", i)
+    log, _ = capsys.readouterr()
+    assert "first site 0" in log
+    assert "second site 0" in log
+    assert "first site 1" not in log
+
+
+def test_summary_after_silence(capsys):
+    logger = Loggable("sampling_test")
+    logger.set_level("INFO")
+    logger.set_sampling(RateLimit(2, period=0.05))
+    emit(logger, range(100))
+    for _ in range(100):
+        time.sleep(0.01)
+        log, _ = capsys.readouterr()
+        if "Suppressed" in log:
+            break
+    assert "Suppressed 98 messages from" in log
+
+
+def test_flush_suppressed(capsys):
+    logger = Loggable("sampling_test")
+    logger.set_level("INFO")
+    logger.set_sampling(RateLimit(1))
+    emit(logger, range(5))
+    logger.flush_suppressed()
+    log, _ = capsys.readouterr()
+    assert "Suppressed 4 messages" in log
+
+
+def test_disable(capsys):
+    logger = Loggable("sampling_test")
+    logger.set_level("INFO")
+    logger.set_sampling(RateLimit(1)).set_sampling(None)
+    emit(logger, range(5))
+    log, _ = capsys.readouterr()
+    assert emitted(log, range(5)) == list(range(5))
+
+
+def test_pickle():
+    sampler = CallSiteSampler(RateLimit(1))
+    sampler.sites["x"] = None
+    sampler2 = pickle.loads(pickle.dumps(sampler))
+    assert sampler2.sites == {}
+    assert sampler2.policy.n == 1
@@ -0,0 +1,65 @@
+import logging
+
+from loggable import Loggable
+from loggable.stacks import STACK_FRAMES, StackCache, capture, render_stack
+
+
+def caller():
+    return capture(5)
+
+
+def test_capture():
+    frames = caller()
+    assert frames[0][0] is caller.__code__
+    assert frames[1][0] is test_capture.__code__
+    assert len(frames) <= 5
+
+
+def test_render_is_cached():
+    cache = StackCache()
+    frames = caller()
+    text = cache.render(frames)
+    assert text.startswith("Stack (most recent call last):")
+    assert "return capture(5)" in text
+    assert cache.render(frames) is text
+
+
+def test_render_stack():
+    record = logging.makeLogRecord({STACK_FRAMES: caller()})
+    render_stack(record)
+    assert "in caller" in record.stack_info
+    assert not hasattr(record, STACK_FRAMES)
+
+
+class TestTbLimit:
+    def test_stack_written_by_handler(self, capsys):
+        logger = Loggable("stack_test", output="plain")
+        logger.set_level("INFO", tb_limit=3)
+        try:
+            logger.info("with stack")
+        finally:
+            logger.set_tb_limit(0)
+        out, err = capsys.readouterr()
+        assert not err
+        assert "with stack\nStack (most recent call last):" in out
+        assert 'logger.info("with stack")' in out
+        assert "loggable/__init__.py" not in out
+
+    def test_rendered_only_when_written(self):
+        logger = Loggable("stack_test")
+        records = []
+
+        class Recorder(logging.Handler):
+            def emit(self, record):
+                records.append(record)
+
+        logger.set_level("ERROR", tb_limit=3)
+        recorder = Recorder()
+        logger.add_handler(recorder)
+        try:
+            logger.error("with stack")
+        finally:
+            logger.remove_handler(recorder)
+            logger.set_tb_limit(0)
+        assert getattr(records[0], STACK_FRAMES, None) is None
+        assert "Stack (most recent call last)" in records[0].stack_info
@@ -0,0 +1,64 @@
+from loggable import condense_long_lists
+from loggable.summarizers import summarize
+import pprint
+import pytest
+
+np = pytest.importorskip("numpy")
+
+
+def test_not_supported():
+    assert summarize([1, 2, 3]) is None
+    assert summarize("string") is None
+
+
+def test_ndarray():
+    a = np.arange(1000, dtype="int64").reshape(10, 100)
+    text = repr(summarize(a, n=4))
+    assert text == (
+        "ndarray(shape=(10, 100), dtype=int64, size=7.8 KiB, "
+        "values=[0, 1, ..., 998, 999], min=0, max=999, mean=499.5)"
+    )
+
+
+def test_ndarray_ignores_nan():
+    text = repr(summarize(np.array([np.nan, 1.0, 3.0])))
+    assert "min=1.0, max=3.0, mean=2" in text
+
+
+def test_ndarray_without_stats():
+    text = repr(summarize(np.array(["a", "b"])))
+    assert "values=['a', 'b']" in text
+    assert "min" not in text
+
+
+def test_empty_and_scalar():
+    assert "values=[]" in repr(summarize(np.array([])))
+    assert repr(summarize(np.array(5))) == "5"
+
+
+def test_full_repr_is_never_built(monkeypatch):
+    a = np.arange(10)
+    monkeypatch.setattr(np, "array_repr", lambda *args, **kwargs: 1 / 0)
+    monkeypatch.setattr(np, "array2string", lambda *args, **kwargs: 1 / 0)
+    assert "ndarray(" in repr(summarize(a))
+
+
+def test_condense_long_lists():
+    condensed = condense_long_lists({"a": np.zeros((1000, 1000))})
+    text = pprint.pformat(condensed)
+    assert text.startswith("{'a': ndarray(shape=(1000, 1000), dtype=float64")
+    assert "size=7.6 MiB" in text
+
+
+def test_pandas():
+    pd = pytest.importorskip("pandas")
+    s = pd.Series(np.arange(100.0), name="x")
+    text = repr(summarize(s, n=2))
+    assert text.startswith("Series(name='x', length=100, dtype=float64")
+    assert "values=[0.0, ..., 99.0], min=0.0, max=99.0" in text
+
+    df = pd.DataFrame({"a": np.arange(10), "b": ["x"] * 10, "c": np.ones(10)})
+    text = repr(summarize(df, n=2))
+    assert text.startswith("DataFrame(shape=(10, 3), size=")
+    assert "'a': int64 (min=0, max=9, mean=4.5)" in text
+    assert "...(1 more)" in text
@@ -0,0 +1,234 @@
+import asyncio
+import json
+import random
+import threading
+import time
+
+import pytest
+
+from loggable import Loggable, TimedLoggable
+from loggable.timing import Histogram, TimingAggregator, Tracer, format_ns
+
+
+@pytest.fixture
+def stats(monkeypatch):
+    aggregator = TimingAggregator()
+    monkeypatch.setattr(TimedLoggable, "stats", aggregator)
+    return aggregator
+
+
+class TestHistogram:
+    def test_small_values_are_exact(self):
+        h = Histogram()
+        for x in range(100):
+            h.add(x)
+        assert h.quantiles((0.0, 0.5, 1.0)) == [0, 49, 99]
+
+    def test_relative_error(self):
+        random.seed(0)
+        values = sorted(random.randint(1000, 10**9) for _ in range(10000))
+        h = Histogram()
+        for x in values:
+            h.add(x)
+        for q, estimate in zip((0.5, 0.95, 0.99), h.quantiles((0.5, 0.95, 0.99))):
+            exact = values[int(q * len(values)) - 1]
+            assert abs(estimate - exact) / exact < 0.02
+        assert len(h.counts) < 2000
+
+    def test_empty(self):
+        assert Histogram().quantiles((0.5,)) == [None]
+
+
+class TestTimedLoggable:
+    def test_time(self):
+        logger = Loggable("timing_test")
+        timeit = logger.timeit("INFO").enter()
+        timeit.exit()
+        assert timeit.elapsed_ns == timeit.t2 - timeit.t1
+        assert timeit.elapsed_ns >= 0
+        assert timeit.time.total_seconds() * 1e9 == pytest.approx(
+            timeit.elapsed_ns, abs=1000
+        )
+
+    def test_finished_message(self, capsys):
+        logger = Loggable("timing_test")
+        logger.set_level("INFO")
+        with logger.timeit("INFO"):
+            pass
+        log, _ = capsys.readouterr()
+        assert "Started at" in log
+        assert "Finished in 0:00:00" in log
+
+    def test_recorded_when_disabled(self, stats, capsys):
+        logger = Loggable("timing_test")
+        logger.set_level("ERROR")
+        for _ in range(10):
+            with logger.timeit("INFO", prefix="hot"):
+                pass
+        with logger.timeit("INFO", prefix="cold"):
+            pass
+        log, _ = capsys.readouterr()
+        assert not log
+        snapshot = stats.snapshot()
+        assert snapshot["hot"]["count"] == 10
+        assert snapshot["cold"]["count"] == 1
+        hot = snapshot["hot"]
+        assert hot["min"] <= hot["p50"] <= hot["p99"] <= hot["max"] * 1.02
+
+    def test_log_timings(self, stats, capsys):
+        logger = Loggable("timing_test")
+        logger.set_level("INFO")
+        with logger.timeit("DEBUG", prefix="block"):
+            pass
+        capsys.readouterr()
+        logger.log_timings("INFO", reset=True)
+        log, _ = capsys.readouterr()
+        assert "Timings:" in log
+        assert "block" in log
+        assert "p95" in log
+        assert not stats.snapshot()
+
+
+def test_format_ns():
+    assert format_ns(500) == "500ns"
+    assert format_ns(1500) == "1.5us"
+    assert format_ns(2.5e9) == "2.5s"
+
+
+@pytest.fixture
+def tracer(monkeypatch):
+    tracer = Tracer()
+    monkeypatch.setattr(TimedLoggable, "tracer", tracer)
+    return tracer
+
+
+class TestTracer:
+    def test_call_tree(self, tracer):
+        logger = Loggable("tracer_test")
+        for _ in range(3):
+            with logger.timeit("INFO", prefix="outer") as outer:
+                with outer.timeit("INFO", prefix="inner"):
+                    time.sleep(0.001)
+                with logger.timeit("INFO", prefix="other"):
+                    pass
+        outer_node = tracer.root.children["outer"]
+        assert outer_node.count == 3
+        assert set(outer_node.children) == {"inner", "other"}
+        inner = outer_node.children["inner"]
+        assert inner.count == 3
+        assert inner.total >= 3e6
+        assert outer_node.total >= inner.total
+        assert outer_node.self_ns == outer_node.total - inner.total - (
+            outer_node.children["other"].total
+        )
+
+    def test_threads_have_their_own_stack(self, tracer):
+        logger = Loggable("tracer_test")
+
+        def work():
+            with logger.timeit("INFO", prefix="thread"):
+                pass
+
+        with logger.timeit("INFO", prefix="main"):
+            t = threading.Thread(target=work)
+            t.start()
+            t.join()
+        assert set(tracer.root.children) == {"main", "thread"}
+
+    def test_chrome_trace(self, tracer, tmpdir):
+        logger = Loggable("tracer_test")
+        with logger.timeit("INFO", prefix="outer") as outer:
+            with outer.timeit("INFO", prefix="inner"):
+                pass
+        path = str(tmpdir.join("trace.json"))
+        tracer.write_chrome_trace(path)
+        with open(path) as f:
+            events = json.load(f)["traceEvents"]
+        assert [e["name"] for e in events] == ["inner", "outer"]
+        inner, outer = events
+        assert inner["ph"] == "X"
+        assert outer["ts"] <= inner["ts"]
+        assert inner["ts"] + inner["dur"] <= outer["ts"] + outer["dur"]
+
+    def test_collapsed(self, tracer):
+        logger = Loggable("tracer_test")
+        with logger.timeit("INFO", prefix="outer") as outer:
+            with outer.timeit("INFO", prefix="inner"):
+                time.sleep(0.002)
+        lines = dict(line.rsplit(" ", 1) for line in tracer.collapsed().splitlines())
+        assert int(lines["outer;inner"]) >= 2000
+
+    def test_max_nodes(self, tracer):
+        tracer.max_nodes = 3
+        logger = Loggable("tracer_test")
+        for i in range(10):
+            with logger.timeit("INFO", prefix="block{}".format(i)):
+                pass
+        assert set(tracer.root.children) == {"block0", "block1", "..."}
+        assert tracer.root.children["..."].count == 8
+
+
+class TestTimed:
+    def test_times_every_call(self, stats, tracer, capsys):
+        logger = Loggable("timed_test")
+        logger.set_level("INFO")
+
+        @logger.timed("INFO")
+        def work(x, y=1):
+            return x + y
+
+        assert work(1, y=2) == 3
+        assert work.__name__ == "work"
+        log, _ = capsys.readouterr()
+        assert 'TimedLoggable("{}"): Finished in'.format(work.__qualname__) in log
+        assert stats.snapshot()[work.__qualname__]["count"] == 1
+        assert tracer.root.children[work.__qualname__].count == 1
+
+    def test_sample_rate(self, stats, capsys):
+        logger = Loggable("timed_test")
+        logger.set_level("ERROR")
+
+        @logger.timed("INFO", prefix="sampled", sample_rate=0.01)
+        def work():
+            pass
+
+        for _ in range(1000):
+            work()
+        assert stats.snapshot()["sampled"]["count"] == 10
+        log, _ = capsys.readouterr()
+        assert not log
+
+    def test_exception_is_timed(self, stats):
+        logger = Loggable("timed_test")
+
+        @logger.timed("INFO", prefix="failing")
+        def fail():
+            raise ValueError
+
+        with pytest.raises(ValueError):
+            fail()
+        assert stats.snapshot()["failing"]["count"] == 1
+
+    def test_coroutine_function(self, stats, capsys):
+        logger = Loggable("timed_test")
+        logger.set_level("INFO")
+
+        @logger.timed("INFO", prefix="coroutine")
+        async def work(x):
+            await asyncio.sleep(0.05)
+            return x
+
+        loop = asyncio.new_event_loop()
+        try:
+            assert loop.run_until_complete(work(1)) == 1
+        finally:
+            loop.close()
+        assert asyncio.iscoroutinefunction(work)
+        assert stats.snapshot()["coroutine"]["count"] == 1
+        assert stats.snapshot()["coroutine"]["total"] >= 50 * 10**6
+        log, _ = capsys.readouterr()
+        assert 'TimedLoggable("coroutine"): Finished in' in log
+
+    def test_invalid_sample_rate(self):
+        with pytest.raises(ValueError):
+            Loggable("timed_test").timed("INFO", sample_rate=0)